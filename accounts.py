@@ -0,0 +1,167 @@
+import argparse
+import csv
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from extensions import *
+from models import User, Role
+from forms import RegisterForm
+from passwords import password_hasher
+
+
+# =====================
+# User accounts
+# =====================
+# Usernames and emails are unique in the database. Registration and the bulk
+# import look both up for any number of new users with one query
+# (find_taken), before any time goes into password hashes; the unique
+# constraints catch whatever slips through between that query and the insert
+# (two people registering the same name at once), and that is reported the
+# same way. Onboard a batch of students from a spreadsheet with:
+#
+#     python accounts.py students.xlsx --output created.csv
+#
+# The sheet needs username, email and whatsapp_no columns. Rows without a
+# password get a generated one, listed in the output file.
+
+USERNAME_TAKEN = 'Username already exists. Please choose a different one.'
+EMAIL_TAKEN = 'Email already exists. Please choose a different one.'
+IMPORT_BATCH_SIZE = 500
+
+
+def find_taken(usernames, emails):
+    """(usernames, emails) among the given ones that already belong to a user, lowercased."""
+    usernames = {username for username in usernames if username}
+    emails = {email for email in emails if email}
+    if not usernames and not emails:
+        return set(), set()
+    rows = db.session.query(User.username, User.email) \
+        .filter(db.or_(User.username.in_(usernames), User.email.in_(emails))).all()
+    wanted_usernames = {username.lower() for username in usernames}
+    wanted_emails = {email.lower() for email in emails}
+    return ({row.username.lower() for row in rows if row.username.lower() in wanted_usernames},
+            {row.email.lower() for row in rows if row.email.lower() in wanted_emails})
+
+
+def check_available(form):
+    """Add an error to the username and email fields of a RegisterForm if they are taken."""
+    taken_usernames, taken_emails = find_taken([form.username.data], [form.email.data])
+    if form.username.data.lower() in taken_usernames:
+        form.username.errors.append(USERNAME_TAKEN)
+    if form.email.data.lower() in taken_emails:
+        form.email.errors.append(EMAIL_TAKEN)
+    return not (taken_usernames or taken_emails)
+
+
+# ----- bulk import -----
+
+def import_users(rows, batch_size=IMPORT_BATCH_SIZE):
+    """Create users from dicts with username, email, whatsapp_no and optionally password.
+
+    Every row is checked like a registration. Each batch of rows is looked up
+    with one query, hashed on the password pool and inserted with one INSERT.
+    Returns one result dict per row: row, username, email, status ('created'
+    or 'skipped'), error and, for generated passwords, password.
+    """
+    results = []
+    seen_usernames = set()
+    seen_emails = set()
+    for start in range(0, len(rows), batch_size):
+        batch = []
+        for number, row in enumerate(rows[start:start + batch_size], start + 1):
+            result = {'row': number, 'username': _text(row.get('username')), 'email': _text(row.get('email')),
+                      'status': 'skipped', 'error': None, 'password': None}
+            results.append(result)
+            password = _text(row.get('password'))
+            if not password:
+                password = result['password'] = secrets.token_urlsafe(9)
+            form = RegisterForm(formdata=None, meta={'csrf': False}, data={
+                'username': result['username'], 'email': result['email'], 'password': password,
+                'whatsappno': _text(row.get('whatsapp_no'))})
+            if not form.validate():
+                result['error'] = '; '.join(f"{name}: {errors[0]}" for name, errors in form.errors.items())
+            elif result['username'].lower() in seen_usernames:
+                result['error'] = 'Username appears more than once in the file'
+            elif result['email'].lower() in seen_emails:
+                result['error'] = 'Email appears more than once in the file'
+            else:
+                seen_usernames.add(result['username'].lower())
+                seen_emails.add(result['email'].lower())
+                batch.append((result, form))
+        _create_batch(batch)
+    for result in results:
+        if result['status'] != 'created':
+            result['password'] = None
+    return results
+
+
+def _text(value):
+    if value is None or value != value:  # Empty spreadsheet cells come in as NaN
+        return ''
+    return str(value).strip()
+
+
+def _create_batch(batch):
+    taken_usernames, taken_emails = find_taken([result['username'] for result, _ in batch],
+                                               [result['email'] for result, _ in batch])
+    accepted = []
+    for result, form in batch:
+        if result['username'].lower() in taken_usernames:
+            result['error'] = USERNAME_TAKEN
+        elif result['email'].lower() in taken_emails:
+            result['error'] = EMAIL_TAKEN
+        else:
+            accepted.append((result, form))
+    if not accepted:
+        return
+
+    with ThreadPoolExecutor(max_workers=password_hasher.workers) as pool:
+        hashes = list(pool.map(password_hasher.hash, [form.password.data for _, form in accepted]))
+    users = [{'username': form.username.data, 'email': form.email.data, 'password': password,
+              'whatsapp_no': form.whatsappno.data, 'role': Role.USER, 'created_at': datetime.utcnow()}
+             for (_, form), password in zip(accepted, hashes)]
+    try:
+        db.session.execute(insert(User), users)
+        db.session.commit()
+        for result, _ in accepted:
+            result['status'] = 'created'
+    except IntegrityError:
+        # Someone registered one of these names meanwhile, insert one by one to find out which
+        db.session.rollback()
+        for (result, _), user in zip(accepted, users):
+            try:
+                db.session.execute(insert(User), [user])
+                db.session.commit()
+                result['status'] = 'created'
+            except IntegrityError:
+                db.session.rollback()
+                result['error'] = 'Username or email already exists'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Create user accounts from a spreadsheet')
+    parser.add_argument('path', help='.xlsx or .csv file with username, email, whatsapp_no and password columns')
+    parser.add_argument('--sheet', help='sheet name (default: the first sheet)')
+    parser.add_argument('--output', help='write every row with its status (and generated password) to this csv')
+    parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+    import pandas as pd
+    if args.path.endswith('.csv'):
+        frame = pd.read_csv(args.path, dtype=str)
+    else:
+        frame = pd.read_excel(args.path, sheet_name=args.sheet or 0, dtype=str)
+    frame.columns = [str(column).strip().lower().replace(' ', '_') for column in frame.columns]
+    from setup import create_app
+    with create_app().app_context():
+        results = import_users(frame.to_dict('records'), args.batch_size)
+    created = sum(result['status'] == 'created' for result in results)
+    print(f"Created {created} of {len(results)} users")
+    for result in results:
+        if result['error']:
+            print(f"  row {result['row']} ({result['username'] or '?'}): {result['error']}")
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['row', 'username', 'email', 'status', 'error', 'password'])
+            writer.writeheader()
+            writer.writerows(results)
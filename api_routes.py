@@ -1,5 +1,8 @@
 from extensions import *
 from models import *
+from pricing import quote_buckets
+from menu_cache import menu_cache
+from restaurant_directory import restaurant_directory
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
@@ -11,35 +14,46 @@ def get_menu_items():
 
     if not restaurant_id:
         return {"error": "Restaurant ID is required."}, 400
+    if not any(entry.id == restaurant_id for entry in restaurant_directory.snapshot().restaurants):
+        return {"error": "Restaurant not found."}, 404
 
-    # Query the database for menu items of that restaurant
-    menu_items = Menu.query.filter_by(restaurant_id=restaurant_id, is_available=True).all()
-
-    # Group by category (optional, but useful)
-    categories = {}
-    for item in menu_items:
-        if item.category not in categories:
-            categories[item.category] = []
-        categories[item.category].append({
-            'id': item.id,
-            'name': item.name,
-            'price': float(item.price),
-            'description': item.description,
-            'image_url': item.image_url,
-            'is_available': item.is_available
-        })
-
-    return jsonify(categories)
+    # Served from the prebuilt snapshot, with a 304 when the browser already has it
+    snapshot = menu_cache.get(restaurant_id)
+    response = current_app.response_class(snapshot.body, mimetype='application/json')
+    response.set_etag(snapshot.etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 @api_bp.route('/restaurants', methods=['GET'])
 def get_restaurants():
-    restaurants = Restaurant.query.all()
-    restaurants_data = [
-        {
-            'id': restaurant.id,
-            'name': restaurant.name
-            # No logo for now
-        } 
-        for restaurant in restaurants
-    ]
-    return jsonify(restaurants_data)
+    # Same snapshot the templates list, with a 304 when the browser already has it
+    snapshot = restaurant_directory.snapshot()
+    response = current_app.response_class(snapshot.body, mimetype='application/json')
+    response.set_etag(snapshot.etag)
+    response.headers['X-Restaurants-Version'] = str(snapshot.version)
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+# API to reprice many buckets at once, e.g. {"buckets": [{"bucket": [...], "delivery_type": "express", "promo_code": "X"}]}
+@api_bp.route('/quotes', methods=['POST'])
+@login_required
+def get_quotes():
+    data = request.get_json(silent=True) or {}
+    buckets = data.get('buckets')
+    if not isinstance(buckets, list):
+        return {"error": "A list of buckets is required."}, 400
+
+    requests = []
+    for entry in buckets:
+        if not isinstance(entry, dict) or not isinstance(entry.get('bucket', []), list) \
+                or not all(isinstance(item, dict) for item in entry.get('bucket', [])):
+            return {"error": "Invalid bucket format."}, 400
+        if not isinstance(entry.get('delivery_type'), (str, type(None))) \
+                or not isinstance(entry.get('promo_code'), (str, type(None))):
+            return {"error": "delivery_type and promo_code must be strings."}, 400
+        requests.append((entry.get('bucket', []), entry.get('delivery_type'), entry.get('promo_code')))
+
+    return jsonify({'quotes': [quote.to_dict() for quote in quote_buckets(requests)]})
@@ -0,0 +1,72 @@
+"""Login throughput benchmark for the password hashing pool.
+
+Runs many concurrent password checks through passwords.PasswordHasher, the
+way a burst of logins would, and reports logins per second overall and per
+core, latency and how many were turned away with a 503.
+
+    python bench_passwords.py --logins 500 --clients 64
+    python bench_passwords.py --rounds 10 --hash-workers 2 --queue 16
+    python bench_passwords.py --inline   # hash on the calling thread, no pool, for comparison
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask
+from passwords import PasswordHasher, PasswordHasherBusy, _hash, _verify
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--logins', type=int, default=500)
+    parser.add_argument('--clients', type=int, default=64, help='concurrent login requests')
+    parser.add_argument('--rounds', type=int, default=12, help='bcrypt work factor')
+    parser.add_argument('--hash-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--queue', type=int, default=64, help='logins hashing or waiting at once')
+    parser.add_argument('--inline', action='store_true')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config['BCRYPT_LOG_ROUNDS'] = args.rounds
+    app.config['PASSWORD_HASH_WORKERS'] = args.hash_workers
+    app.config['PASSWORD_HASH_QUEUE'] = args.queue
+    app.config['WEB_THREADS'] = args.clients + 1
+    app.config['PASSWORD_HASH_TIMEOUT'] = 600
+    hasher = PasswordHasher(app)
+    stored = _hash('correct horse battery staple', args.rounds)
+
+    def login(_):
+        started = time.perf_counter()
+        try:
+            if args.inline:
+                valid, _ = _verify('correct horse battery staple', stored, args.rounds)
+            else:
+                valid, _ = hasher.verify('correct horse battery staple', stored)
+        except PasswordHasherBusy:
+            return 'busy', time.perf_counter() - started
+        return ('ok' if valid else 'error'), time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        results = list(pool.map(login, range(args.logins)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(seconds for outcome, seconds in results if outcome == 'ok')
+    ok = len(latencies)
+    cores = min(args.clients if args.inline else args.hash_workers, os.cpu_count() or 1)
+    print(f"rounds={args.rounds} clients={args.clients} "
+          f"{'inline' if args.inline else f'hash_workers={args.hash_workers} queue={args.queue}'} "
+          f"cpus={os.cpu_count()}")
+    print(f"logins attempted : {args.logins}")
+    print(f"logins verified  : {ok}")
+    print(f"rejected (503)   : {sum(outcome == 'busy' for outcome, _ in results)}")
+    print(f"elapsed          : {elapsed:.2f}s")
+    print(f"throughput       : {ok / elapsed:.1f} logins/s")
+    print(f"per core         : {ok / elapsed / cores:.1f} logins/s ({cores} cores busy)")
+    if latencies:
+        print(f"latency p50/p95  : {latencies[len(latencies) // 2] * 1000:.0f}ms / "
+              f"{latencies[int(len(latencies) * 0.95)] * 1000:.0f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+from flask import g
+from extensions import *
+from pricing import bucket_menu_id, price_index, quote_bucket
+from session_store import server_sessions
+
+
+# =====================
+# Session bucket
+# =====================
+# The bucket is kept next to the server-side session (see session_store.py),
+# under the same id, in a compact form, menu id -> quantity plus the
+# restaurant it is from:
+#
+#     {'restaurant_id': 3, 'items': {'12': 2, '15': 1}}
+#
+# Names and prices are never stored, they come from the price index whenever
+# the bucket is quoted (see pricing.py).
+#
+# The menu page changes the bucket with small operations (apply_bucket_ops)
+# instead of sending all of it. Every change bumps the bucket's version;
+# operations carry the version they were made against and are rejected if
+# the bucket changed since (another tab, /save_bucket, a placed order). The
+# store only writes a new version over the one it was read at, so of two
+# tabs sending operations against the same version at once, one gets a
+# BucketConflict.
+
+BUCKET_OPS = ('add', 'remove', 'set', 'clear')
+
+
+class BucketConflict(Exception):
+    """The bucket changed since the version an operation was made against."""
+
+
+def load_bucket():
+    """The session bucket as the list of items quote_bucket() takes."""
+    stored = _stored()[1]
+    if not stored:
+        return []
+    restaurant_id = stored['restaurant_id']
+    return [{'menu_id': int(menu_id), 'quantity': quantity, 'restaurant_id': restaurant_id}
+            for menu_id, quantity in stored['items'].items()]
+
+
+def store_bucket(bucket):
+    """Store a bucket sent by the browser (items with an id, quantity and restaurant_id)."""
+    restaurant_id = None
+    items = {}
+    for item in bucket:
+        try:
+            menu_id = bucket_menu_id(item)
+            quantity = int(item.get('quantity', 1))
+            if restaurant_id is None:
+                restaurant_id = int(item.get('restaurant_id'))
+        except (AttributeError, TypeError, ValueError):
+            continue
+        if menu_id is None or quantity <= 0:
+            continue
+        items[str(menu_id)] = items.get(str(menu_id), 0) + quantity
+    _overwrite(restaurant_id, items)
+
+
+def clear_bucket():
+    _overwrite(None, {})
+
+
+def bucket_version():
+    return _stored()[0]
+
+
+def _store():
+    return server_sessions.interface.backend(current_app)
+
+
+def _stored():
+    """(version, {'restaurant_id': ..., 'items': ...} or None), read once per request."""
+    if 'bucket' not in g:
+        row = _store().get_bucket(session.sid)
+        # Sessions from before the bucket had its own row still carry it inside
+        g.bucket = (row[0], json.loads(row[1])) if row else (0, session.get('bucket'))
+    return g.bucket
+
+
+def _save(restaurant_id, items, version):
+    """Write the bucket over version, or raise BucketConflict if it is not at version any more."""
+    stored = {'restaurant_id': restaurant_id, 'items': items} if items else None
+    ttl = int(current_app.permanent_session_lifetime.total_seconds())
+    if not _store().set_bucket(session.sid, version, json.dumps(stored).encode('utf-8'), ttl):
+        g.pop('bucket', None)
+        raise BucketConflict()
+    g.bucket = (version + 1, stored)
+    session.pop('bucket', None)
+
+
+def _overwrite(restaurant_id, items, attempts=5):
+    # Replaces the bucket whatever it holds, the last write wins
+    for _ in range(attempts - 1):
+        try:
+            return _save(restaurant_id, items, bucket_version())
+        except BucketConflict:
+            continue
+    _save(restaurant_id, items, bucket_version())
+
+
+def apply_bucket_ops(version, restaurant_id, ops):
+    """Apply a list of bucket operations made against version, all or none.
+
+    Each op is {'op': 'add', 'id': 12, 'quantity': 2}, {'op': 'set', 'id': 12,
+    'quantity': 3} (0 removes), {'op': 'remove', 'id': 12} or {'op': 'clear'};
+    added and set items must be available at restaurant_id. Raises
+    BucketConflict for a stale version and ValueError for an invalid op.
+    Returns the new version.
+    """
+    if version != bucket_version():
+        raise BucketConflict()
+    stored = _stored()[1] or {'restaurant_id': None, 'items': {}}
+    current_restaurant = stored['restaurant_id']
+    items = dict(stored['items'])
+    menu = price_index.snapshot().items
+    for op in ops:
+        kind = op.get('op')
+        if kind not in BUCKET_OPS:
+            raise ValueError(f"Unknown bucket operation: {kind}")
+        if kind == 'clear':
+            items = {}
+            continue
+        try:
+            menu_id = int(op.get('id'))
+            quantity = int(op.get('quantity', 1))
+        except (TypeError, ValueError):
+            raise ValueError("Invalid item or quantity")
+        if kind == 'remove' or (kind == 'set' and quantity == 0):
+            items.pop(str(menu_id), None)
+            continue
+        if quantity <= 0:
+            raise ValueError("Invalid item or quantity")
+        entry = menu.get(menu_id)
+        if entry is None or not entry[3] or str(entry[0]) != str(restaurant_id):
+            raise ValueError("This item is not available")
+        if items and current_restaurant != entry[0]:
+            raise ValueError("Your bucket has items from another restaurant")
+        current_restaurant = entry[0]
+        items[str(menu_id)] = items.get(str(menu_id), 0) + quantity if kind == 'add' else quantity
+    _save(current_restaurant if items else None, items, version)
+    return bucket_version()
+
+
+def bucket_totals():
+    """Version, item count and subtotal of the session bucket."""
+    quote = quote_bucket(load_bucket())
+    return {'version': bucket_version(), 'count': sum(line['quantity'] for line in quote.lines),
+            'subtotal': float(quote.subtotal)}
@@ -0,0 +1,226 @@
+import base64
+from decimal import Decimal
+from extensions import *
+from models import *
+from pricing import bucket_menu_id
+from order_events import order_events
+from sales_rollups import record_delivered
+
+
+# =====================
+# Orders dashboard data
+# =====================
+# Everything the dashboard template touches is loaded up front: user, rider,
+# restaurant and payment are joined in, and the order_item rows of all orders
+# are fetched with a single IN query, so a page costs the same number of
+# statements no matter how many orders it shows. Orders are loaded one
+# restaurant and one view (current/past) at a time, with the filters and the
+# keyset pagination done in SQL, so a page stays the same size as the order
+# table grows.
+
+def order_items_from_json(order):
+    """Unsaved OrderItems parsed from order.items, for orders the backfill has not reached yet."""
+    try:
+        items = json.loads(order.items)
+    except Exception:
+        return []
+    order_items = []
+    for item in items:
+        try:
+            order_items.append(OrderItem(order_id=order.id, menu_id=bucket_menu_id(item),
+                                         restaurant_id=order.restaurant_id, name=item.get('name', ''),
+                                         price=Decimal(str(item.get('price', 0))),
+                                         quantity=int(item.get('quantity', 1)), created_at=order.created_at))
+        except (TypeError, ValueError, ArithmeticError):
+            continue
+    return order_items
+
+
+def attach_menu_items(orders):
+    """Set order.menu_items to the OrderItem rows of every order."""
+    items = {}
+    order_ids = [order.id for order in orders]
+    if order_ids:
+        for item in OrderItem.query.filter(OrderItem.order_id.in_(order_ids)).order_by(OrderItem.id):
+            items.setdefault(item.order_id, []).append(item)
+    for order in orders:
+        order.menu_items = items.get(order.id) or order_items_from_json(order)
+    return orders
+
+
+# Delivered orders are "past", everything else still needs attention
+PAST_STATUSES = (OrderStatus.DELIVERED,)
+CURRENT_STATUSES = tuple(status for status in OrderStatus if status not in PAST_STATUSES)
+DASHBOARD_VIEWS = ('current', 'past')
+
+
+def encode_cursor(order):
+    payload = json.dumps([order.created_at.isoformat(), order.id])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Return (created_at, order_id) from a cursor, or None if it is missing or malformed."""
+    try:
+        created_at, order_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return datetime.fromisoformat(created_at), order_id
+    except Exception:
+        return None
+
+
+def load_dashboard_page(restaurant_id, view='current', cursor=None, limit=50):
+    """One page of a restaurant's orders, newest first, keyset paginated on (created_at, id).
+
+    Returns (orders, next_cursor); next_cursor is None on the last page.
+
+    Every status of the view is its own range of the (restaurant_id, status,
+    created_at) index, read newest first and cut off at the page size, so the
+    database never sorts more than a page. The heads of those ranges are
+    merged here and the page's orders are loaded by id.
+    """
+    position = decode_cursor(cursor) if cursor else None
+    keys = []
+    for status in PAST_STATUSES if view == 'past' else CURRENT_STATUSES:
+        query = db.session.query(Order.created_at, Order.id) \
+            .filter(Order.restaurant_id == restaurant_id, Order.status == status)
+        if position:
+            created_at, order_id = position
+            query = query.filter(db.or_(
+                Order.created_at < created_at,
+                db.and_(Order.created_at == created_at, Order.id < order_id),
+            ))
+        keys.extend(tuple(key) for key in query.order_by(Order.created_at.desc(), Order.id.desc()).limit(limit + 1))
+    keys = sorted(keys, reverse=True)[:limit + 1]
+    if not keys:
+        return [], None
+
+    orders = Order.query.options(
+        db.joinedload(Order.user),
+        db.joinedload(Order.rider),
+        db.joinedload(Order.restaurant),
+        db.joinedload(Order.payment),
+    ).filter(Order.id.in_([order_id for _, order_id in keys[:limit]])) \
+        .order_by(Order.created_at.desc(), Order.id.desc()).all()
+    next_cursor = encode_cursor(orders[-1]) if len(keys) > limit else None
+    return attach_menu_items(orders), next_cursor
+
+
+def status_change(current, requested):
+    """The OrderStatus named requested, if an admin may move an order from current to it.
+
+    Raises ValueError for an unknown status or a change ORDER_STATUS_TRANSITIONS
+    does not allow. Staying in the same status is always allowed.
+    """
+    try:
+        status = OrderStatus[requested]
+    except (KeyError, TypeError):
+        raise ValueError(f"Unknown status {requested}")
+    if status != current and status not in ORDER_STATUS_TRANSITIONS[current]:
+        raise ValueError(f"Cannot change {current.name} to {status.name}")
+    return status
+
+
+def parse_rider_id(rider_id):
+    """rider_id as an int, None for '' or None. Raises ValueError if it is not a number."""
+    if rider_id is None or rider_id == '':
+        return None
+    if isinstance(rider_id, bool):
+        raise ValueError(f"Invalid rider_id {rider_id!r}")
+    try:
+        return int(rider_id)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid rider_id {rider_id!r}")
+
+
+def bulk_update_orders(changes):
+    """Apply many status/rider changes in one transaction.
+
+    changes is a list of {'order_id': ..., 'status': 'VERIFIED', 'rider_id': 3}
+    dicts; 'status' and 'rider_id' are optional (rider_id None unassigns). The
+    orders are read and locked with one SELECT, every change is checked against
+    ORDER_STATUS_TRANSITIONS, and the valid ones are written with one UPDATE per
+    target status and per rider. Returns {order_id: {'success': bool, ...}}.
+    Commits; the caller only has to report the results. Raises ValueError,
+    before anything is read, if an order_id is not a string or a rider_id not
+    a number.
+    """
+    merged = {}
+    for change in changes:
+        if not isinstance(change.get('order_id'), str):
+            raise ValueError(f"Invalid order_id {change.get('order_id')!r}")
+        # Several changes to one order are merged, later keys win
+        merged.setdefault(change['order_id'], {}).update(change)
+    changes = list(merged.values())
+    for change in changes:
+        if 'rider_id' in change:
+            change['rider_id'] = parse_rider_id(change['rider_id'])
+    order_ids = list(merged)
+    rows = db.session.query(Order.id, Order.restaurant_id, Order.status, Order.created_at) \
+        .filter(Order.id.in_(order_ids)).with_for_update().all()
+    orders = {row.id: row for row in rows}
+    rider_ids = {change['rider_id'] for change in changes if change.get('rider_id') is not None}
+    known_riders = {rider_id for (rider_id,) in db.session.query(Rider.id).filter(Rider.id.in_(rider_ids))} \
+        if rider_ids else set()
+
+    results = {}
+    by_status = {}
+    by_rider = {}
+    for change in changes:
+        order_id = change.get('order_id')
+        order = orders.get(order_id)
+        if order is None:
+            results[order_id] = {'success': False, 'error': 'Order not found'}
+            continue
+
+        status = order.status
+        if change.get('status'):
+            try:
+                status = status_change(order.status, change['status'])
+            except ValueError as e:
+                results[order_id] = {'success': False, 'error': str(e)}
+                continue
+
+        if 'rider_id' in change:
+            rider_id = change['rider_id']
+            if rider_id is not None and rider_id not in known_riders:
+                results[order_id] = {'success': False, 'error': 'Rider not found'}
+                continue
+            by_rider.setdefault(rider_id, []).append(order_id)
+
+        if status != order.status:
+            by_status.setdefault(status, []).append(order_id)
+        results[order_id] = {'success': True, 'status': status.name}
+
+    for status, ids in by_status.items():
+        Order.query.filter(Order.id.in_(ids)).update({'status': status}, synchronize_session=False)
+    for rider_id, ids in by_rider.items():
+        Order.query.filter(Order.id.in_(ids)).update({'rider_id': rider_id}, synchronize_session=False)
+    record_delivered((orders[order_id].restaurant_id, orders[order_id].created_at, orders[order_id].status,
+                      OrderStatus[result['status']])
+                     for order_id, result in results.items() if result['success'])
+    for order_id, result in results.items():
+        if result['success']:
+            order_events.publish_event(order_id, orders[order_id].restaurant_id, result['status'], 'updated')
+    db.session.commit()
+    return results
+
+
+def dashboard_counts(restaurant_ids, restaurant_id):
+    """{restaurant_id: {'current': n, 'past': n}}, past only for restaurant_id.
+
+    Both counts are ranges of the (restaurant_id, status, created_at) index:
+    current orders (every restaurant's tab shows them) are only what is still
+    being worked on, and the past count is taken for the one restaurant whose
+    view is open, over delivered orders not yet moved to the archive (see
+    order_archive.py). Neither reads the whole order table.
+    """
+    counts = {rid: {'current': 0, 'past': None} for rid in restaurant_ids}
+    rows = db.session.query(Order.restaurant_id, db.func.count(Order.id)) \
+        .filter(Order.restaurant_id.in_(restaurant_ids), Order.status.in_(CURRENT_STATUSES)) \
+        .group_by(Order.restaurant_id)
+    for rid, count in rows:
+        counts[rid]['current'] = count
+    if restaurant_id in counts:
+        counts[restaurant_id]['past'] = db.session.query(db.func.count(Order.id)) \
+            .filter(Order.restaurant_id == restaurant_id, Order.status.in_(PAST_STATUSES)).scalar()
+    return counts
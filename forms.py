@@ -16,7 +16,7 @@ class RegisterForm(FlaskForm):
                              validators=[DataRequired(), Length(min=8, max=20)], 
                              render_kw={"placeholder": "Password"})
 
-    Whatsapp = StringField('Whatsapp',
+    whatsappno = StringField('Whatsapp',
                            validators=[DataRequired(), Length(min=10, max=20)],
                            render_kw={"placeholder": "Whatsapp"})
     
@@ -26,17 +26,8 @@ class RegisterForm(FlaskForm):
 
     submit = SubmitField("Register")
 
-    def validate_username(self, username):
-        from models import User
-        existing_username = User.query.filter_by(username=username.data).first()
-        if existing_username:
-            raise ValidationError('Username already exists. Please choose a different one.')
-
-    def validate_email(self, email):
-        from models import User
-        existing_email = User.query.filter_by(email=email.data).first()
-        if existing_email:
-            raise ValidationError('Email already exists. Please choose a different one.')
+    # Username and email availability is checked by accounts.check_available,
+    # with one query for both, after these validators pass
 
 #----------------------------------------------------------------------
 # Login Form
@@ -0,0 +1,78 @@
+import collections
+import hashlib
+import threading
+import time
+from markupsafe import Markup
+from extensions import *
+from models import Menu
+
+
+# =====================
+# Menu snapshots
+# =====================
+# /api/menu is served from a per-restaurant snapshot that is built once and
+# kept as the serialized JSON body. The ETag is a hash of those bytes, so every
+# worker process hands out the same tag for the same menu and browsers mostly
+# get 304s. The menu page gets the same bytes inline (MenuSnapshot.inline), so
+# it needs no request at all on first load. MenuModelView drops the snapshot
+# of the restaurant it changed; changes made by another process show up after
+# MENU_CACHE_TTL seconds. At most MENU_CACHE_SIZE restaurants are kept, least
+# recently used first out; /api/menu only asks for restaurants in the
+# restaurant directory, so made-up ids never get a snapshot.
+
+class MenuSnapshot:
+    def __init__(self, restaurant_id, body, loaded_at):
+        self.restaurant_id = restaurant_id
+        self.body = body
+        self.etag = hashlib.sha1(body).hexdigest()
+        self.loaded_at = loaded_at
+        # The same JSON, safe to put inside a <script> tag
+        self.inline = Markup(body.decode('utf-8').replace('<', '\\u003c').replace('>', '\\u003e')
+                             .replace('&', '\\u0026'))
+
+
+def build_menu(restaurant_id):
+    """Available menu items of a restaurant grouped by category."""
+    menu_items = Menu.query.filter_by(restaurant_id=restaurant_id, is_available=True).order_by(Menu.id).all()
+    categories = {}
+    for item in menu_items:
+        if item.category not in categories:
+            categories[item.category] = []
+        categories[item.category].append({
+            'id': item.id,
+            'name': item.name,
+            'price': float(item.price),
+            'description': item.description,
+            'image_url': item.image_url,
+            'is_available': item.is_available
+        })
+    return categories
+
+
+class MenuCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshots = collections.OrderedDict()  # restaurant_id -> MenuSnapshot
+
+    def get(self, restaurant_id):
+        """The snapshot of an existing restaurant's menu, the caller checks that it exists."""
+        ttl = current_app.config.get('MENU_CACHE_TTL', 300)
+        with self._lock:
+            snapshot = self._snapshots.get(restaurant_id)
+            if snapshot is None or time.monotonic() - snapshot.loaded_at > ttl:
+                body = current_app.json.dumps(build_menu(restaurant_id)).encode('utf-8')
+                snapshot = self._snapshots[restaurant_id] = MenuSnapshot(restaurant_id, body, time.monotonic())
+            self._snapshots.move_to_end(restaurant_id)
+            while len(self._snapshots) > current_app.config.get('MENU_CACHE_SIZE', 200):
+                self._snapshots.popitem(last=False)
+        return snapshot
+
+    def invalidate(self, restaurant_id=None):
+        with self._lock:
+            if restaurant_id is None:
+                self._snapshots.clear()
+            else:
+                self._snapshots.pop(restaurant_id, None)
+
+
+menu_cache = MenuCache()
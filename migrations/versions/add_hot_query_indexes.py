@@ -0,0 +1,60 @@
+"""add indexes for the hot order, menu, payment and user queries
+
+Revision ID: add_hot_query_indexes
+Revises: backfill_order_item
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_hot_query_indexes'
+down_revision = 'backfill_order_item'
+branch_labels = None
+depends_on = None
+
+def check_unique(table, columns):
+    # A unique index can't be built over duplicates, say which ones instead of
+    # failing halfway with a bare IntegrityError
+    cols = [sa.column(column) for column in columns]
+    duplicates = op.get_bind().execute(
+        sa.select(*cols, sa.func.count()).select_from(sa.table(table, *cols))
+        .group_by(*cols).having(sa.func.count() > 1).limit(10)).all()
+    if duplicates:
+        raise RuntimeError(f"Duplicate {table} ({', '.join(columns)}) values must be resolved first: {duplicates}")
+
+def upgrade():
+    check_unique('user', ['username'])
+    check_unique('order', ['restaurant_id', 'sequence'])
+    check_unique('payment', ['order_id'])
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_user_username', ['username'])
+
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.create_index('uq_order_restaurant_id_sequence', ['restaurant_id', 'sequence'], unique=True)
+        batch_op.create_index('ix_order_user_id_created_at', ['user_id', 'created_at'], unique=False)
+        batch_op.create_index('ix_order_restaurant_id_status_created_at',
+                              ['restaurant_id', 'status', 'created_at'], unique=False)
+
+    with op.batch_alter_table('menu', schema=None) as batch_op:
+        batch_op.create_index('ix_menu_restaurant_id_is_available', ['restaurant_id', 'is_available'], unique=False)
+
+    with op.batch_alter_table('payment', schema=None) as batch_op:
+        batch_op.create_index('uq_payment_order_id', ['order_id'], unique=True)
+
+def downgrade():
+    with op.batch_alter_table('payment', schema=None) as batch_op:
+        batch_op.drop_index('uq_payment_order_id')
+
+    with op.batch_alter_table('menu', schema=None) as batch_op:
+        batch_op.drop_index('ix_menu_restaurant_id_is_available')
+
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.drop_index('ix_order_restaurant_id_status_created_at')
+        batch_op.drop_index('ix_order_user_id_created_at')
+        batch_op.drop_index('uq_order_restaurant_id_sequence')
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_user_username', type_='unique')
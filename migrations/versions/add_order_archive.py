@@ -0,0 +1,81 @@
+"""add order, payment and order item archive tables
+
+Revision ID: add_order_archive
+Revises: add_sales_rollups
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_order_archive'
+down_revision = 'add_sales_rollups'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table('order_archive',
+        sa.Column('id', sa.String(length=64), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('sequence', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('restaurant_id', sa.Integer(), nullable=False),
+        sa.Column('rider_id', sa.Integer(), nullable=True),
+        sa.Column('items', sa.Text(), nullable=False),
+        sa.Column('status', sa.Enum('PENDING', 'VERIFIED', 'DELIVERED', 'PAYMENT_VERIFICATION', name='archived_orderstatus'), nullable=False),
+        sa.Column('special_instructions', sa.Text(), nullable=True),
+        sa.Column('archived_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id', 'created_at')
+    )
+    with op.batch_alter_table('order_archive', schema=None) as batch_op:
+        batch_op.create_index('ix_order_archive_user_id_created_at', ['user_id', 'created_at'], unique=False)
+        batch_op.create_index('ix_order_archive_restaurant_id_created_at', ['restaurant_id', 'created_at'], unique=False)
+
+    if op.get_bind().dialect.name == 'mysql':
+        # Monthly partitions are split off p_future by order_archive.ensure_partitions
+        op.execute("ALTER TABLE order_archive PARTITION BY RANGE COLUMNS(created_at) "
+                   "(PARTITION p_future VALUES LESS THAN (MAXVALUE))")
+
+    op.create_table('payment_archive',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('order_id', sa.String(length=64), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('amount', sa.DECIMAL(precision=10, scale=2), nullable=False),
+        sa.Column('status', sa.Enum('PENDING', 'COMPLETED', 'FAILED', 'REFUNDED', name='archived_paymentstatus'), nullable=False),
+        sa.Column('drive_file_id', sa.String(length=255), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('payment_archive', schema=None) as batch_op:
+        batch_op.create_index('ix_payment_archive_order_id', ['order_id'], unique=False)
+
+    op.create_table('order_item_archive',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('order_id', sa.String(length=64), nullable=False),
+        sa.Column('menu_id', sa.Integer(), nullable=True),
+        sa.Column('restaurant_id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('price', sa.DECIMAL(precision=10, scale=2), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('order_item_archive', schema=None) as batch_op:
+        batch_op.create_index('ix_order_item_archive_order_id', ['order_id'], unique=False)
+
+def downgrade():
+    # Drops archived orders with their tables, move them back first if they are still needed
+    with op.batch_alter_table('order_item_archive', schema=None) as batch_op:
+        batch_op.drop_index('ix_order_item_archive_order_id')
+
+    op.drop_table('order_item_archive')
+    with op.batch_alter_table('payment_archive', schema=None) as batch_op:
+        batch_op.drop_index('ix_payment_archive_order_id')
+
+    op.drop_table('payment_archive')
+    with op.batch_alter_table('order_archive', schema=None) as batch_op:
+        batch_op.drop_index('ix_order_archive_restaurant_id_created_at')
+        batch_op.drop_index('ix_order_archive_user_id_created_at')
+
+    op.drop_table('order_archive')
@@ -0,0 +1,29 @@
+"""add order_event table for the live dashboard feed
+
+Revision ID: add_order_event
+Revises: add_slip_blob
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_order_event'
+down_revision = 'add_slip_blob'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table('order_event',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('order_id', sa.String(length=64), nullable=False),
+        sa.Column('restaurant_id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=20), nullable=False),
+        sa.Column('status', sa.String(length=32), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+def downgrade():
+    op.drop_table('order_event')
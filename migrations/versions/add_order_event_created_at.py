@@ -0,0 +1,21 @@
+"""index order_event.created_at for the retention deletes
+
+Revision ID: add_order_event_created_at
+Revises: add_order_archive
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_order_event_created_at'
+down_revision = 'add_order_archive'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_index('ix_order_event_created_at', 'order_event', ['created_at'], unique=False)
+
+def downgrade():
+    op.drop_index('ix_order_event_created_at', table_name='order_event')
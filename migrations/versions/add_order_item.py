@@ -0,0 +1,41 @@
+"""add order_item table
+
+Revision ID: add_order_item
+Revises: add_order_event
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_order_item'
+down_revision = 'add_order_event'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table('order_item',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('order_id', sa.String(length=64), nullable=False),
+        sa.Column('menu_id', sa.Integer(), nullable=True),
+        sa.Column('restaurant_id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('price', sa.DECIMAL(precision=10, scale=2), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['order_id'], ['order.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('order_item', schema=None) as batch_op:
+        batch_op.create_index('ix_order_item_order_id', ['order_id'], unique=False)
+        batch_op.create_index('ix_order_item_menu_id_created_at', ['menu_id', 'created_at'], unique=False)
+        batch_op.create_index('ix_order_item_restaurant_id_created_at', ['restaurant_id', 'created_at'], unique=False)
+
+def downgrade():
+    with op.batch_alter_table('order_item', schema=None) as batch_op:
+        batch_op.drop_index('ix_order_item_restaurant_id_created_at')
+        batch_op.drop_index('ix_order_item_menu_id_created_at')
+        batch_op.drop_index('ix_order_item_order_id')
+
+    op.drop_table('order_item')
@@ -0,0 +1,50 @@
+"""add sales rollup tables
+
+Revision ID: add_sales_rollups
+Revises: add_hot_query_indexes
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_sales_rollups'
+down_revision = 'add_hot_query_indexes'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # The tables start empty, fill them with: python sales_rollups.py
+    op.create_table('restaurant_sales_hourly',
+        sa.Column('restaurant_id', sa.Integer(), nullable=False),
+        sa.Column('hour', sa.DateTime(), nullable=False),
+        sa.Column('orders', sa.Integer(), nullable=False),
+        sa.Column('items', sa.Integer(), nullable=False),
+        sa.Column('revenue', sa.DECIMAL(precision=12, scale=2), nullable=False),
+        sa.Column('delivered_orders', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('restaurant_id', 'hour')
+    )
+    op.create_table('menu_item_sales_daily',
+        sa.Column('menu_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('restaurant_id', sa.Integer(), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('revenue', sa.DECIMAL(precision=12, scale=2), nullable=False),
+        sa.PrimaryKeyConstraint('menu_id', 'day')
+    )
+    with op.batch_alter_table('menu_item_sales_daily', schema=None) as batch_op:
+        batch_op.create_index('ix_menu_item_sales_daily_restaurant_id_day', ['restaurant_id', 'day'], unique=False)
+
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.create_index('ix_order_created_at', ['created_at'], unique=False)
+
+def downgrade():
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.drop_index('ix_order_created_at')
+
+    with op.batch_alter_table('menu_item_sales_daily', schema=None) as batch_op:
+        batch_op.drop_index('ix_menu_item_sales_daily_restaurant_id_day')
+
+    op.drop_table('menu_item_sales_daily')
+    op.drop_table('restaurant_sales_hourly')
@@ -0,0 +1,32 @@
+"""add slip_blob table and upload_job.content_hash
+
+Revision ID: add_slip_blob
+Revises: add_upload_job
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_slip_blob'
+down_revision = 'add_upload_job'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table('slip_blob',
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('remote_id', sa.String(length=255), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('sha256')
+    )
+    with op.batch_alter_table('upload_job', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+
+def downgrade():
+    with op.batch_alter_table('upload_job', schema=None) as batch_op:
+        batch_op.drop_column('content_hash')
+
+    op.drop_table('slip_blob')
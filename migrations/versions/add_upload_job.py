@@ -0,0 +1,44 @@
+"""add upload_job table and payment.drive_file_id
+
+Revision ID: add_upload_job
+Revises: seed_total_orders
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_upload_job'
+down_revision = 'seed_total_orders'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    with op.batch_alter_table('payment', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('drive_file_id', sa.String(length=255), nullable=True))
+
+    op.create_table('upload_job',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('payment_id', sa.Integer(), nullable=False),
+        sa.Column('filename', sa.String(length=255), nullable=False),
+        sa.Column('local_path', sa.String(length=512), nullable=False),
+        sa.Column('status', sa.Enum('PENDING', 'RUNNING', 'DONE', 'FAILED', name='uploadjobstatus'), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('run_at', sa.DateTime(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['payment_id'], ['payment.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('upload_job', schema=None) as batch_op:
+        batch_op.create_index('ix_upload_job_status_run_at', ['status', 'run_at'], unique=False)
+
+def downgrade():
+    with op.batch_alter_table('upload_job', schema=None) as batch_op:
+        batch_op.drop_index('ix_upload_job_status_run_at')
+
+    op.drop_table('upload_job')
+
+    with op.batch_alter_table('payment', schema=None) as batch_op:
+        batch_op.drop_column('drive_file_id')
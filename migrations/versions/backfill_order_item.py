@@ -0,0 +1,105 @@
+"""copy order.items JSON into order_item
+
+Revision ID: backfill_order_item
+Revises: add_order_item
+Create Date: 2026-10-18 14:10:00.000000
+
+"""
+import json
+from decimal import Decimal
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'backfill_order_item'
+down_revision = 'add_order_item'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+order = sa.table('order',
+    sa.column('id', sa.String),
+    sa.column('restaurant_id', sa.Integer),
+    sa.column('items', sa.Text),
+    sa.column('created_at', sa.DateTime),
+)
+order_item = sa.table('order_item',
+    sa.column('order_id', sa.String),
+    sa.column('menu_id', sa.Integer),
+    sa.column('restaurant_id', sa.Integer),
+    sa.column('name', sa.String),
+    sa.column('price', sa.DECIMAL),
+    sa.column('quantity', sa.Integer),
+    sa.column('created_at', sa.DateTime),
+)
+menu = sa.table('menu',
+    sa.column('id', sa.Integer),
+    sa.column('name', sa.String),
+    sa.column('price', sa.DECIMAL),
+)
+
+def parse_items(row):
+    try:
+        items = json.loads(row.items)
+    except (TypeError, ValueError):
+        return []
+    parsed = []
+    for item in items if isinstance(items, list) else []:
+        try:
+            menu_id = item.get('menu_id', item.get('id'))
+            parsed.append({
+                'menu_id': int(menu_id) if menu_id is not None else None,
+                'name': item.get('name'),
+                'price': Decimal(str(item['price'])) if item.get('price') is not None else None,
+                'quantity': int(item.get('quantity', 1)),
+            })
+        except (AttributeError, TypeError, ValueError, ArithmeticError):
+            continue
+    return parsed
+
+def upgrade():
+    # Orders are walked in primary key order BATCH_SIZE at a time and every
+    # batch is inserted in its own short transaction, so the order table is
+    # never locked for long. Orders that already have order_item rows (placed
+    # after the deploy, or converted by an earlier run that was interrupted)
+    # are skipped, so the migration can simply be run again.
+    conn = op.get_bind()
+    with op.get_context().autocommit_block():
+        last_id = ''
+        while True:
+            rows = conn.execute(
+                sa.select(order.c.id, order.c.restaurant_id, order.c['items'], order.c.created_at)
+                .where(order.c.id > last_id).order_by(order.c.id).limit(BATCH_SIZE)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            ids = [row.id for row in rows]
+            done = set(conn.execute(
+                sa.select(order_item.c.order_id).where(order_item.c.order_id.in_(ids)).distinct()
+            ).scalars())
+            parsed = {row.id: parse_items(row) for row in rows if row.id not in done}
+
+            # Old orders may lack the name or price, take them from the menu
+            menu_ids = {item['menu_id'] for items in parsed.values() for item in items
+                        if item['menu_id'] is not None and (item['name'] is None or item['price'] is None)}
+            menus = {m.id: m for m in conn.execute(
+                sa.select(menu.c.id, menu.c.name, menu.c.price).where(menu.c.id.in_(menu_ids)))} if menu_ids else {}
+
+            values = []
+            for row in rows:
+                for item in parsed.get(row.id, []):
+                    fallback = menus.get(item['menu_id'])
+                    name = item['name'] if item['name'] is not None else (fallback.name if fallback else '')
+                    price = item['price'] if item['price'] is not None else (fallback.price if fallback else 0)
+                    values.append({'order_id': row.id, 'menu_id': item['menu_id'],
+                                   'restaurant_id': row.restaurant_id, 'name': name[:100], 'price': price,
+                                   'quantity': item['quantity'], 'created_at': row.created_at})
+            if values:
+                conn.execute(order_item.insert(), values)
+
+def downgrade():
+    # order.items is still written alongside order_item, nothing is lost
+    op.execute("DELETE FROM order_item")
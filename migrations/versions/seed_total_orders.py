@@ -0,0 +1,27 @@
+"""seed restaurant.total_orders from existing order sequences
+
+Revision ID: seed_total_orders
+Revises: add_total_orders
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'seed_total_orders'
+down_revision = 'add_total_orders'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # total_orders is now the order number counter, start it after the
+    # highest sequence already handed out for each restaurant
+    op.execute("""
+        UPDATE restaurant
+        SET total_orders = COALESCE(
+            (SELECT MAX(o.sequence) FROM `order` o WHERE o.restaurant_id = restaurant.id), 0)
+    """)
+
+def downgrade():
+    op.execute("UPDATE restaurant SET total_orders = 0")
@@ -10,6 +10,14 @@ class OrderStatus(PyEnum):
     DELIVERED = "delivered"
     PAYMENT_VERIFICATION = "payment_verification"
 
+# Status changes an admin may make, checked by the single and the bulk order update
+ORDER_STATUS_TRANSITIONS = {
+    OrderStatus.PENDING: {OrderStatus.PAYMENT_VERIFICATION, OrderStatus.VERIFIED},
+    OrderStatus.PAYMENT_VERIFICATION: {OrderStatus.PENDING, OrderStatus.VERIFIED},
+    OrderStatus.VERIFIED: {OrderStatus.PENDING, OrderStatus.DELIVERED},
+    OrderStatus.DELIVERED: set(),
+}
+
 # Payment Status Enum
 class PaymentStatus(PyEnum):
     PENDING = "pending"
@@ -28,6 +36,13 @@ class PromoCodeType(PyEnum):
     DELIVERY = "delivery"
     MENU = "menu"
 
+# Upload Job Status Enum
+class UploadJobStatus(PyEnum):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
 class Role(PyEnum):
     ADMIN = "admin"
     USER ="user"
@@ -37,7 +52,7 @@ class Role(PyEnum):
 class User(db.Model,UserMixin):
     __tablename__ = 'user'  # Explicitly set table name
     id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(100), nullable=False)
+    username = db.Column(db.String(100), nullable=False)  # Login looks users up by username, see uq_user_username
     email = db.Column(db.String(100), unique=True, nullable=False)
     password = db.Column(db.String(200), nullable=False)
     whatsapp_no = db.Column(db.String(20), nullable=False)
@@ -48,7 +63,10 @@ class User(db.Model,UserMixin):
         return True  # Modify this if you want to deactivate users
 
 
-    __table_args__ = {'extend_existing': True}  # Allow redefining if the table exists
+    __table_args__ = (
+        db.UniqueConstraint('username', name='uq_user_username'),  # Same name as in the migration
+        {'extend_existing': True},  # Allow redefining if the table exists
+    )
 
 # Restaurant Table
 class Restaurant(db.Model):
@@ -97,7 +115,10 @@ class Menu(db.Model):
     image_url = db.Column(db.Text, nullable=True)
     category = db.Column(db.String(50), nullable=False)
 
-    __table_args__ = {'extend_existing': True}  
+    __table_args__ = (
+        db.Index('ix_menu_restaurant_id_is_available', 'restaurant_id', 'is_available'),
+        {'extend_existing': True},
+    )
 
 # Orders Table (Stores Main Order Info, Items are Stored in a Parseable Format)
 class Order(db.Model):
@@ -116,28 +137,91 @@ class Order(db.Model):
     user = db.relationship('User', backref='orders')
     restaurant = db.relationship('Restaurant', backref='orders')
     rider = db.relationship('Rider', backref='orders')
+    payment = db.relationship('Payment', uselist=False, backref='order')
+    order_items = db.relationship('OrderItem', backref='order', order_by='OrderItem.id')
 
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        db.Index('uq_order_restaurant_id_sequence', 'restaurant_id', 'sequence', unique=True),
+        db.Index('ix_order_user_id_created_at', 'user_id', 'created_at'),  # /account
+        db.Index('ix_order_restaurant_id_status_created_at', 'restaurant_id', 'status', 'created_at'),  # Dashboard
+        db.Index('ix_order_created_at', 'created_at'),  # Sales rollup rebuilds
+        {'extend_existing': True},
+    )
 
     @staticmethod
-    def generate_order_id(restaurant_id):
-        """Generate a new order ID using restaurant code and sequence number"""
-        restaurant = Restaurant.query.get(restaurant_id)
-        if not restaurant or not restaurant.code:
-            raise ValueError("Restaurant not found or has no code")
-        
-        # Get the last sequence number for this restaurant
-        last_order = Order.query.filter_by(restaurant_id=restaurant_id).order_by(Order.sequence.desc()).first()
-        sequence = (last_order.sequence + 1) if last_order else 1
-        
-        # Format: RESTAURANT_CODE-SEQUENCE (e.g., K-000001)
-        return f"{restaurant.code}-{str(sequence).zfill(6)}"
+    def allocate_order_number(restaurant_id):
+        """Take the next (order_id, sequence) from the restaurant's order counter"""
+        from order_numbers import allocator
+        return allocator.next_order_number(restaurant_id)
 
     @property
     def display_code(self):
         """Return the display code for the order"""
         return self.id
 
+# Order Items Table (One Row Per Ordered Menu Item, Name And Price As They Were At Checkout)
+class OrderItem(db.Model):
+    __tablename__ = 'order_item'
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.String(64), db.ForeignKey('order.id'), nullable=False)
+    menu_id = db.Column(db.Integer, nullable=True)  # No foreign key, menu items can be deleted after they were ordered
+    restaurant_id = db.Column(db.Integer, nullable=False)  # Copied from the order for per-restaurant aggregation
+    name = db.Column(db.String(100), nullable=False)
+    price = db.Column(db.DECIMAL(10,2), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)  # Same as the order's
+
+    __table_args__ = (
+        db.Index('ix_order_item_order_id', 'order_id'),
+        db.Index('ix_order_item_menu_id_created_at', 'menu_id', 'created_at'),
+        db.Index('ix_order_item_restaurant_id_created_at', 'restaurant_id', 'created_at'),
+        {'extend_existing': True},
+    )
+
+    @property
+    def line_total(self):
+        return self.price * self.quantity
+
+# Sales Rollup Tables (Kept Up To Date By sales_rollups.py, Read By The Dashboards)
+class RestaurantSalesHourly(db.Model):
+    __tablename__ = 'restaurant_sales_hourly'
+    restaurant_id = db.Column(db.Integer, primary_key=True)
+    hour = db.Column(db.DateTime, primary_key=True)  # Hour the orders were placed in (UTC)
+    orders = db.Column(db.Integer, default=0, nullable=False)
+    items = db.Column(db.Integer, default=0, nullable=False)
+    revenue = db.Column(db.DECIMAL(12,2), default=0, nullable=False)  # Sum of payment amounts
+    delivered_orders = db.Column(db.Integer, default=0, nullable=False)
+
+    __table_args__ = {'extend_existing': True}
+
+class MenuItemSalesDaily(db.Model):
+    __tablename__ = 'menu_item_sales_daily'
+    menu_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, primary_key=True)  # Day the orders were placed on (UTC)
+    restaurant_id = db.Column(db.Integer, nullable=False)
+    quantity = db.Column(db.Integer, default=0, nullable=False)
+    revenue = db.Column(db.DECIMAL(12,2), default=0, nullable=False)  # Sum of line totals
+
+    __table_args__ = (
+        db.Index('ix_menu_item_sales_daily_restaurant_id_day', 'restaurant_id', 'day'),
+        {'extend_existing': True},
+    )
+
+# Order Events Table (Feed Of New Orders And Status Changes For The Live Dashboard)
+class OrderEvent(db.Model):
+    __tablename__ = 'order_event'
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.String(64), nullable=False)
+    restaurant_id = db.Column(db.Integer, nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # 'created' or 'updated'
+    status = db.Column(db.String(32), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_order_event_created_at', 'created_at'),  # Retention deletes
+        {'extend_existing': True},
+    )
+
 # Payments Table (Tracks Order Payments)
 class Payment(db.Model):
     __tablename__ = 'payment'  
@@ -146,9 +230,122 @@ class Payment(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     amount = db.Column(db.DECIMAL(10,2), nullable=False)
     status = db.Column(Enum(PaymentStatus), default=PaymentStatus.PENDING, nullable=False)
+    drive_file_id = db.Column(db.String(255), nullable=True)  # Set by the upload worker once the slip is stored
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
-    __table_args__ = {'extend_existing': True}  
+    __table_args__ = (
+        db.Index('uq_payment_order_id', 'order_id', unique=True),  # One payment per order
+        {'extend_existing': True},
+    )
+
+# Upload Jobs Table (Payment Slips Waiting To Be Uploaded By The Background Workers)
+class UploadJob(db.Model):
+    __tablename__ = 'upload_job'
+    id = db.Column(db.Integer, primary_key=True)
+    payment_id = db.Column(db.Integer, db.ForeignKey('payment.id'), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)  # Original (secured) filename
+    local_path = db.Column(db.String(512), nullable=False)  # Spooled copy of the slip
+    content_hash = db.Column(db.String(64), nullable=True)  # SHA-256 of the slip, see SlipBlob
+    status = db.Column(Enum(UploadJobStatus), default=UploadJobStatus.PENDING, nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    run_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)  # Next attempt, or lease expiry while running
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    payment = db.relationship('Payment', backref='upload_jobs')
+
+    __table_args__ = (
+        db.Index('ix_upload_job_status_run_at', 'status', 'run_at'),
+        {'extend_existing': True},
+    )
+
+# Slip Blobs Table (Each Distinct Payment Slip, Keyed By Content Hash, Is Uploaded Once)
+class SlipBlob(db.Model):
+    __tablename__ = 'slip_blob'
+    sha256 = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.Integer, nullable=False)
+    remote_id = db.Column(db.String(255), nullable=False)  # File id returned by the upload storage
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = {'extend_existing': True}
+
+# Archive Tables (Delivered Orders Moved Out Of The Hot Tables By order_archive.py)
+# Same columns as order/payment/order_item. order_archive is RANGE partitioned by
+# month of created_at on MySQL, which is why created_at is part of its primary
+# key and why none of the archive tables have foreign keys.
+class ArchivedOrder(db.Model):
+    __tablename__ = 'order_archive'
+    id = db.Column(db.String(64), primary_key=True)
+    created_at = db.Column(db.DateTime, primary_key=True)
+    sequence = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    restaurant_id = db.Column(db.Integer, nullable=False)
+    rider_id = db.Column(db.Integer, nullable=True)
+    items = db.Column(db.Text, nullable=False)
+    status = db.Column(Enum(OrderStatus, name='archived_orderstatus'), nullable=False)  # Own type, not order's
+    special_instructions = db.Column(db.Text, nullable=True)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    user = db.relationship('User', primaryjoin='foreign(ArchivedOrder.user_id) == User.id', viewonly=True)
+    restaurant = db.relationship('Restaurant', primaryjoin='foreign(ArchivedOrder.restaurant_id) == Restaurant.id',
+                                 viewonly=True)
+    rider = db.relationship('Rider', primaryjoin='foreign(ArchivedOrder.rider_id) == Rider.id', viewonly=True)
+    payment = db.relationship('ArchivedPayment', primaryjoin='foreign(ArchivedPayment.order_id) == ArchivedOrder.id',
+                              uselist=False, viewonly=True)
+    order_items = db.relationship('ArchivedOrderItem', order_by='ArchivedOrderItem.id', viewonly=True,
+                                  primaryjoin='foreign(ArchivedOrderItem.order_id) == ArchivedOrder.id')
+
+    __table_args__ = (
+        db.Index('ix_order_archive_user_id_created_at', 'user_id', 'created_at'),
+        db.Index('ix_order_archive_restaurant_id_created_at', 'restaurant_id', 'created_at'),
+        {'extend_existing': True},
+    )
+
+    @property
+    def display_code(self):
+        return self.id
+
+class ArchivedPayment(db.Model):
+    __tablename__ = 'payment_archive'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    order_id = db.Column(db.String(64), nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    amount = db.Column(db.DECIMAL(10,2), nullable=False)
+    status = db.Column(Enum(PaymentStatus, name='archived_paymentstatus'), nullable=False)
+    drive_file_id = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_payment_archive_order_id', 'order_id'),
+        {'extend_existing': True},
+    )
+
+class ArchivedOrderItem(db.Model):
+    __tablename__ = 'order_item_archive'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    order_id = db.Column(db.String(64), nullable=False)
+    menu_id = db.Column(db.Integer, nullable=True)
+    restaurant_id = db.Column(db.Integer, nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+    price = db.Column(db.DECIMAL(10,2), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_order_item_archive_order_id', 'order_id'),
+        {'extend_existing': True},
+    )
+
+    @property
+    def line_total(self):
+        return self.price * self.quantity
+
+# (order, payment, order item) models of the hot and the archive tables, for
+# code that has to see every order ever placed
+ORDER_TABLES = (
+    (Order, Payment, OrderItem),
+    (ArchivedOrder, ArchivedPayment, ArchivedOrderItem),
+)
 
 # Complaints Table (Each Restaurant Has Its Own Complaints, Visible to Managers)
 class Complaint(db.Model):
@@ -0,0 +1,189 @@
+import argparse
+import logging
+from datetime import timedelta
+from sqlalchemy import insert, select, literal
+from extensions import *
+from models import *
+from dashboard import encode_cursor, decode_cursor, order_items_from_json
+
+
+logger = logging.getLogger(__name__)
+
+
+# =====================
+# Order archive
+# =====================
+# Delivered orders older than ARCHIVE_AFTER_DAYS (default 90) are moved, with
+# their payment and order items, from order/payment/order_item into
+# order_archive/payment_archive/order_item_archive. Each batch of
+# ARCHIVE_BATCH_SIZE orders is copied and deleted in one short transaction, so
+# the hot tables (and every dashboard, account page and index on them) only
+# hold recent or still open orders. Orders with a complaint are left alone, the
+# complaint still points at them, and so are orders whose payment slip upload
+# has not finished (pending, running or failed), until the upload job is done.
+# Run it from cron, e.g. nightly:
+#
+#     python order_archive.py
+#
+# On MySQL order_archive is partitioned by month. Each run first makes sure
+# there is a partition for every month up to next month, by splitting the
+# empty catch-all p_future partition, so archived rows never land in it.
+# find_order() and load_order_history() read both tables, so archived orders
+# still show up on /account and in the order details.
+
+def _columns(table, exclude=()):
+    return [column.name for column in table.columns if column.name not in exclude]
+
+
+def month_start(moment):
+    return datetime(moment.year, moment.month, 1)
+
+
+def next_month(moment):
+    return datetime(moment.year + moment.month // 12, moment.month % 12 + 1, 1)
+
+
+def ensure_partitions(connection, through):
+    """Add monthly order_archive partitions up to and including the month of through (MySQL only)."""
+    if connection.dialect.name != 'mysql':
+        return []
+    rows = connection.execute(db.text(
+        "SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'order_archive' AND PARTITION_NAME IS NOT NULL")).all()
+    if not rows:
+        return []  # Not partitioned (e.g. created before partitioning was possible)
+    bounds = [datetime.strptime(description.strip("'"), '%Y-%m-%d %H:%M:%S')
+              for name, description in rows if name != 'p_future']
+    start = max(bounds) if bounds else month_start(
+        connection.execute(select(db.func.min(Order.created_at))).scalar() or datetime.utcnow())
+    added = []
+    month = start
+    while month <= month_start(through):
+        upper = next_month(month)
+        name = f"p{month:%Y%m}"
+        connection.execute(db.text(
+            f"ALTER TABLE order_archive REORGANIZE PARTITION p_future INTO ("
+            f"PARTITION {name} VALUES LESS THAN ('{upper:%Y-%m-%d %H:%M:%S}'), "
+            f"PARTITION p_future VALUES LESS THAN (MAXVALUE))"))
+        added.append(name)
+        month = upper
+    return added
+
+
+def archive_orders(cutoff=None, batch_size=None, max_batches=None):
+    """Move delivered orders placed before cutoff into the archive. Returns how many were moved."""
+    config = current_app.config
+    if cutoff is None:
+        cutoff = datetime.utcnow() - timedelta(days=config.get('ARCHIVE_AFTER_DAYS', 90))
+    batch_size = batch_size or config.get('ARCHIVE_BATCH_SIZE', 500)
+
+    with db.engine.begin() as connection:
+        added = ensure_partitions(connection, next_month(datetime.utcnow()))
+    if added:
+        logger.info("Added order_archive partitions %s", ', '.join(added))
+
+    due = select(Order.id).where(
+        Order.status == OrderStatus.DELIVERED,
+        Order.created_at < cutoff,
+        ~select(Complaint.id).where(Complaint.order_id == Order.id).exists(),
+        ~select(UploadJob.id).join(Payment, Payment.id == UploadJob.payment_id)
+        .where(Payment.order_id == Order.id, UploadJob.status != UploadJobStatus.DONE).exists(),
+    ).order_by(Order.created_at).limit(batch_size)
+
+    moved = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        order_ids = db.session.execute(due.with_for_update()).scalars().all()
+        if not order_ids:
+            db.session.rollback()
+            break
+        _move(order_ids)
+        db.session.commit()
+        moved += len(order_ids)
+        batches += 1
+    return moved
+
+
+def _move(order_ids):
+    archive = ArchivedOrder.__table__
+    order_columns = _columns(archive, exclude=('archived_at',))
+    db.session.execute(insert(archive).from_select(
+        order_columns + ['archived_at'],
+        select(*[Order.__table__.c[name] for name in order_columns], literal(datetime.utcnow()))
+        .where(Order.id.in_(order_ids))))
+
+    payment_columns = _columns(ArchivedPayment.__table__)
+    db.session.execute(insert(ArchivedPayment.__table__).from_select(
+        payment_columns,
+        select(*[Payment.__table__.c[name] for name in payment_columns]).where(Payment.order_id.in_(order_ids))))
+
+    item_columns = _columns(ArchivedOrderItem.__table__)
+    db.session.execute(insert(ArchivedOrderItem.__table__).from_select(
+        item_columns,
+        select(*[OrderItem.__table__.c[name] for name in item_columns]).where(OrderItem.order_id.in_(order_ids))))
+
+    # Only finished jobs are left (see archive_orders), their slip is on the payment
+    payment_ids = select(Payment.id).where(Payment.order_id.in_(order_ids)).scalar_subquery()
+    UploadJob.query.filter(UploadJob.payment_id.in_(payment_ids)).delete(synchronize_session=False)
+    OrderItem.query.filter(OrderItem.order_id.in_(order_ids)).delete(synchronize_session=False)
+    Payment.query.filter(Payment.order_id.in_(order_ids)).delete(synchronize_session=False)
+    Order.query.filter(Order.id.in_(order_ids)).delete(synchronize_session=False)
+
+
+# ----- reading -----
+
+def find_order(order_id):
+    """The Order, or the ArchivedOrder, with this id. None if there is neither."""
+    return db.session.get(Order, order_id) or ArchivedOrder.query.filter_by(id=order_id).first()
+
+
+def load_order_history(user_id, cursor=None, limit=20):
+    """One page of a user's orders, hot and archived, newest first, keyset paginated on (created_at, id).
+
+    Each table is read with its (user_id, created_at) index, at most limit + 1
+    rows, with the items and payment loaded alongside, so a page costs the
+    same for a user with 5 orders and one with 5000. Returns (orders, next_cursor).
+    Raises ValueError for a malformed cursor.
+    """
+    position = decode_cursor(cursor) if cursor else None
+    if cursor and position is None:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    orders = []
+    for order_model, _, _ in ORDER_TABLES:
+        query = order_model.query.options(db.selectinload(order_model.order_items),
+                                          db.selectinload(order_model.payment)) \
+            .filter(order_model.user_id == user_id)
+        if position:
+            created_at, order_id = position
+            query = query.filter(db.or_(
+                order_model.created_at < created_at,
+                db.and_(order_model.created_at == created_at, order_model.id < order_id),
+            ))
+        orders.extend(query.order_by(order_model.created_at.desc(), order_model.id.desc()).limit(limit + 1))
+    orders.sort(key=lambda order: (order.created_at, order.id), reverse=True)
+    next_cursor = encode_cursor(orders[limit - 1]) if len(orders) > limit else None
+    return orders[:limit], next_cursor
+
+
+def order_summary(order):
+    """What an order history row shows, from the already loaded items and payment."""
+    items = order.order_items or order_items_from_json(order)
+    return {
+        'id': order.id,
+        'created_at': order.created_at,
+        'status': order.status,
+        'summary': ', '.join(f"{item.name} x{item.quantity}" if item.quantity > 1 else item.name for item in items),
+        'item_count': sum(item.quantity for item in items),
+        'total': order.payment.amount if order.payment else sum(item.line_total for item in items),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Move old delivered orders into the archive tables')
+    parser.add_argument('--days', type=int, help='archive orders older than this (default: ARCHIVE_AFTER_DAYS)')
+    parser.add_argument('--batch-size', type=int)
+    args = parser.parse_args()
+    from setup import create_app
+    with create_app().app_context():
+        cutoff = datetime.utcnow() - timedelta(days=args.days) if args.days is not None else None
+        print(f"Archived {archive_orders(cutoff, args.batch_size)} orders")
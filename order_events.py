@@ -0,0 +1,245 @@
+import collections
+import logging
+import threading
+import time
+from datetime import timedelta
+from extensions import *
+from models import OrderEvent, OrderStatus
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+logger = logging.getLogger(__name__)
+
+
+# =====================
+# Live order feed
+# =====================
+# create_order and update_order publish an event in the same transaction as the
+# change. With ORDER_EVENTS_BROKER = 'database' (the default) the event is a row
+# in order_event, so every worker process sees it: one poller thread per process
+# copies new rows into an in-memory ring that all of that process' dashboard
+# streams read from. With 'local' events never leave the process, which is all
+# tests and single-process setups need.
+#
+# Event ids are handed out when a row is inserted, but transactions commit in
+# any order, so the poller can see id 12 before id 11 is committed. Ids it
+# skipped over are kept as gaps and asked for again on every poll until they
+# show up or ORDER_EVENTS_GAP_SECONDS pass (a rolled back transaction never
+# fills its id). The ring is therefore in arrival order, not id order: streams
+# follow their position in the ring, and the SSE id they send is the
+# watermark, the highest id below which every event has already been sent.
+# A browser that reconnects, to this process or another, is caught up from
+# the table starting at that watermark, so it may see an event twice but
+# never misses one. Rows older than ORDER_EVENTS_RETENTION_HOURS are deleted
+# by the pollers.
+
+def order_status_name(status):
+    return status.name if isinstance(status, OrderStatus) else status
+
+
+class OrderEventHub:
+    def __init__(self, app=None):
+        self.app = None
+        self._ring = collections.deque(maxlen=1000)  # (position, event), in arrival order
+        self._cond = threading.Condition()
+        self._wakeup = threading.Event()
+        self._position = 0
+        self._last_id = 0
+        self._gaps = {}  # Skipped event id -> monotonic time to give up on it
+        self._poller = None
+        self._pruned_at = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['order_events'] = self
+        event.listen(Session, 'after_commit', self._after_commit)
+        event.listen(Session, 'after_rollback', self._after_rollback)
+
+    @property
+    def uses_database(self):
+        return self.app.config.get('ORDER_EVENTS_BROKER', 'database') == 'database'
+
+    # ----- publishing -----
+
+    def publish(self, order, kind):
+        """Stage an event for an order; it goes out when the current transaction commits."""
+        self.publish_event(order.id, order.restaurant_id, order.status or OrderStatus.PENDING, kind)
+
+    def publish_event(self, order_id, restaurant_id, status, kind):
+        data = {
+            'kind': kind,
+            'order_id': order_id,
+            'restaurant_id': restaurant_id,
+            'status': order_status_name(status),
+        }
+        if self.uses_database:
+            db.session.add(OrderEvent(**data))
+        db.session.info.setdefault('order_events', []).append(data)
+
+    def _after_commit(self, session):
+        published = session.info.pop('order_events', None)
+        if not published:
+            return
+        if self.uses_database:
+            self._wakeup.set()  # Let the poller pick the new rows up right away
+            return
+        with self._cond:
+            for data in published:
+                self._last_id += 1
+                self._append(dict(data, id=self._last_id))
+            self._cond.notify_all()
+
+    def _after_rollback(self, session):
+        session.info.pop('order_events', None)
+
+    def _append(self, data):
+        self._position += 1
+        self._ring.append((self._position, data))
+
+    def _watermark(self):
+        return min(self._gaps) - 1 if self._gaps else self._last_id
+
+    # ----- subscribing -----
+
+    def stream(self, last_event_id=None, seconds=300):
+        """Server-sent events for the dashboard, resuming after the SSE id last_event_id."""
+        if last_event_id is None:
+            position, resume_id, events = self.position() + ([],)
+        else:
+            position, resume_id, events = self.catch_up(last_event_id)
+        sent = {data['id'] for data in events}  # Caught up from the table, may come round the ring again
+        deadline = time.monotonic() + seconds
+        yield 'retry: 3000\n\n'
+        while True:
+            for number, data in enumerate(events, 1):
+                # Only the end of a batch moves the resume point, a stream cut off
+                # halfway through resumes from the previous one
+                event_id = f"id: {resume_id}\n" if number == len(events) else ''
+                yield f"{event_id}event: {data['kind']}\ndata: {json.dumps(data)}\n\n"
+            if time.monotonic() >= deadline:
+                return
+            batch = self.events_after(position, timeout=15)
+            if batch is None:
+                # Fell behind the ring, pick the missed events up from the table
+                position, watermark, events = self.catch_up(resume_id)
+                sent = {data['id'] for data in events}
+            else:
+                position, watermark, events = batch
+                events = [data for data in events if data['id'] not in sent]
+            resume_id = max(resume_id, watermark)
+            if not events:
+                yield ': ping\n\n'
+
+    def position(self):
+        """(ring position, watermark) to start a stream from now."""
+        self._start_poller()
+        with self._cond:
+            return self._position, self._watermark()
+
+    def events_after(self, position, timeout):
+        """(position, watermark, events) that arrived after position, waiting up to timeout seconds.
+
+        None if some of them already left the ring.
+        """
+        self._start_poller()
+        with self._cond:
+            if self._position <= position:
+                self._cond.wait(timeout)
+            if self._ring and self._ring[0][0] > position + 1:
+                return None
+            return (self._position, self._watermark(),
+                    [data for event_position, data in self._ring if event_position > position])
+
+    def catch_up(self, after_id):
+        """(position, watermark, events) for a stream resuming after the SSE id after_id."""
+        position, watermark = self.position()
+        if self.uses_database:
+            # Read after the position is taken: whatever commits meanwhile is in the
+            # table, in the ring after position, or both
+            events = self._load(after_id)
+        else:
+            with self._cond:
+                events = [data for _, data in self._ring if data['id'] > after_id]
+        return position, max(watermark, after_id), events
+
+    def _start_poller(self):
+        if not self.uses_database or self._poller is not None:
+            return
+        with self._cond:
+            if self._poller is not None:
+                return
+            with self.app.app_context():
+                self._last_id = db.session.query(db.func.max(OrderEvent.id)).scalar() or 0
+                db.session.remove()
+            self._poller = threading.Thread(target=self._poll, name='order-events', daemon=True)
+            self._poller.start()
+
+    def _poll(self):
+        interval = self.app.config.get('ORDER_EVENTS_POLL_INTERVAL', 1)
+        while True:
+            self._wakeup.wait(interval)
+            self._wakeup.clear()
+            try:
+                self._poll_once()
+                self._prune()
+            except Exception:
+                logger.exception("Order event poller failed")
+
+    def _poll_once(self):
+        now = time.monotonic()
+        with self._cond:
+            for event_id in [event_id for event_id, give_up_at in self._gaps.items() if give_up_at <= now]:
+                del self._gaps[event_id]
+            last_id, gaps = self._last_id, list(self._gaps)
+        with self.app.app_context():
+            query = OrderEvent.query.filter(db.or_(OrderEvent.id > last_id, OrderEvent.id.in_(gaps)) if gaps
+                                            else OrderEvent.id > last_id)
+            events = [self._event(row) for row in query.order_by(OrderEvent.id).limit(500)]
+            db.session.remove()
+        if not events:
+            return
+        give_up_at = now + self.app.config.get('ORDER_EVENTS_GAP_SECONDS', 60)
+        with self._cond:
+            for data in events:
+                if self._gaps.pop(data['id'], None) is None:
+                    # Ids skipped over may still be committed by a slower transaction
+                    for skipped in range(max(self._last_id + 1, data['id'] - 1000), data['id']):
+                        self._gaps[skipped] = give_up_at
+                    self._last_id = data['id']
+                self._append(data)
+            self._cond.notify_all()
+
+    def _prune(self):
+        """Delete events older than ORDER_EVENTS_RETENTION_HOURS, every ORDER_EVENTS_PRUNE_SECONDS."""
+        if time.monotonic() - self._pruned_at < self.app.config.get('ORDER_EVENTS_PRUNE_SECONDS', 600):
+            return
+        self._pruned_at = time.monotonic()
+        cutoff = datetime.utcnow() - timedelta(hours=self.app.config.get('ORDER_EVENTS_RETENTION_HOURS', 24))
+        with self.app.app_context():
+            while True:
+                ids = [event_id for (event_id,) in db.session.query(OrderEvent.id)
+                       .filter(OrderEvent.created_at < cutoff).limit(1000)]
+                if not ids:
+                    break
+                OrderEvent.query.filter(OrderEvent.id.in_(ids)).delete(synchronize_session=False)
+                db.session.commit()
+            db.session.remove()
+
+    def _load(self, after_id, limit=500):
+        """The latest events with id > after_id, at most limit of them, oldest first."""
+        with self.app.app_context():
+            rows = OrderEvent.query.filter(OrderEvent.id > after_id).order_by(OrderEvent.id.desc()).limit(limit).all()
+            events = [self._event(row) for row in reversed(rows)]
+            db.session.remove()
+        return events
+
+    @staticmethod
+    def _event(row):
+        return {'id': row.id, 'kind': row.kind, 'order_id': row.order_id,
+                'restaurant_id': row.restaurant_id, 'status': row.status}
+
+
+order_events = OrderEventHub()
@@ -0,0 +1,78 @@
+import csv
+import io
+from datetime import timedelta
+from sqlalchemy import select
+from extensions import *
+from models import *
+
+
+# =====================
+# CSV export
+# =====================
+# /admin/export/orders.csv streams straight from a server-side cursor: the
+# header goes out before the query even runs, then rows are written
+# EXPORT_BATCH_SIZE at a time, so memory stays flat however many orders match.
+# Text typed in by users (names, instructions, numbers) that starts like a
+# formula gets a leading ' so a spreadsheet shows it instead of running it.
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_COLUMNS = ['order_id', 'created_at', 'status', 'restaurant', 'username', 'email', 'whatsapp_no',
+                  'rider', 'payment_amount', 'payment_status', 'payment_slip', 'special_instructions']
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def spreadsheet_safe(value):
+    """value, with a leading ' if a spreadsheet would read it as a formula."""
+    if value and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value or ''
+
+
+def order_filters(since, until, restaurant_id, model=Order):
+    """created_at/restaurant_id conditions on Order (or ArchivedOrder); since and until are inclusive dates."""
+    filters = []
+    if since:
+        filters.append(model.created_at >= datetime.combine(since, datetime.min.time()))
+    if until:
+        filters.append(model.created_at < datetime.combine(until + timedelta(days=1), datetime.min.time()))
+    if restaurant_id:
+        filters.append(model.restaurant_id == restaurant_id)
+    return filters
+
+
+def export_orders_csv(restaurant_id=None, statuses=None, since=None, until=None):
+    """Generator of CSV text chunks for the matching orders, oldest first."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    yield buffer.getvalue()
+
+    # Archived orders are all older than the hot ones, so this stays oldest first
+    for order_model, payment_model, _ in reversed(ORDER_TABLES):
+        filters = order_filters(since, until, restaurant_id, order_model)
+        if statuses:
+            filters.append(order_model.status.in_(statuses))
+        statement = select(order_model.id, order_model.created_at, order_model.status, Restaurant.name,
+                           User.username, User.email, User.whatsapp_no, Rider.name, payment_model.amount,
+                           payment_model.status, payment_model.drive_file_id, order_model.special_instructions) \
+            .join(Restaurant, Restaurant.id == order_model.restaurant_id) \
+            .join(User, User.id == order_model.user_id) \
+            .outerjoin(Rider, Rider.id == order_model.rider_id) \
+            .outerjoin(payment_model, payment_model.order_id == order_model.id) \
+            .where(*filters).order_by(order_model.created_at, order_model.id) \
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        result = db.session.execute(statement)
+        try:
+            for rows in result.partitions():
+                buffer.seek(0)
+                buffer.truncate()
+                for row in rows:
+                    writer.writerow([
+                        row[0], row[1].isoformat(sep=' ') if row[1] else '', row[2].name, spreadsheet_safe(row[3]),
+                        spreadsheet_safe(row[4]), spreadsheet_safe(row[5]), spreadsheet_safe(row[6]),
+                        spreadsheet_safe(row[7]), row[8] if row[8] is not None else '', row[9].name if row[9] else '',
+                        row[10] or '', spreadsheet_safe(row[11]),
+                    ])
+                yield buffer.getvalue()
+        finally:
+            result.close()
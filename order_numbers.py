@@ -0,0 +1,94 @@
+import threading
+from extensions import *
+from models import Restaurant
+from sqlalchemy import func, select
+
+
+# =====================
+# Order number allocator
+# =====================
+# Order numbers come from the restaurant.total_orders counter row. Each
+# allocation is a single UPDATE on that row, so the database row lock is what
+# serialises concurrent checkouts and no two orders can ever get the same
+# number.
+#
+# With ORDER_NUMBER_BLOCK_SIZE = 1 (the default) the UPDATE runs inside the
+# caller's session transaction: the counter row stays locked until the order is
+# committed and a rolled back order gives its number back, so numbers are
+# gapless. With a larger block size every worker reserves a whole block of
+# numbers in its own short transaction and hands them out from memory, which
+# takes the counter row off the hot path at the cost of gaps when a worker
+# restarts with part of a block unused.
+
+restaurant_table = Restaurant.__table__
+
+
+def format_order_id(code, sequence):
+    """Format: RESTAURANT_CODE-SEQUENCE (e.g., K-000001)"""
+    return f"{code}-{str(sequence).zfill(6)}"
+
+
+def reserve_order_numbers(connection, restaurant_id, count=1):
+    """Advance the restaurant's counter by count and return (code, first, last)."""
+    counter = restaurant_table.c.total_orders
+    where = restaurant_table.c.id == restaurant_id
+
+    if connection.dialect.name == 'mysql':
+        # MySQL has no UPDATE ... RETURNING; LAST_INSERT_ID(expr) stores the new
+        # value on the connection so reading it back needs no second lock.
+        result = connection.execute(
+            restaurant_table.update().where(where).values(total_orders=func.last_insert_id(counter + count)))
+        row = None
+        if result.rowcount:
+            row = connection.execute(
+                select(restaurant_table.c.code, func.last_insert_id()).where(where)).first()
+    elif connection.dialect.update_returning:
+        row = connection.execute(
+            restaurant_table.update().where(where).values(total_orders=counter + count)
+            .returning(restaurant_table.c.code, counter)).first()
+    else:
+        result = connection.execute(restaurant_table.update().where(where).values(total_orders=counter + count))
+        row = None
+        if result.rowcount:
+            row = connection.execute(select(restaurant_table.c.code, counter).where(where)).first()
+
+    if not row or not row[0]:
+        raise ValueError("Restaurant not found or has no code")
+    code, last = row[0], int(row[1])
+    return code, last - count + 1, last
+
+
+class OrderNumberAllocator:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._blocks = {}  # restaurant_id -> [code, next_sequence, last_sequence]
+
+    def next_order_number(self, restaurant_id):
+        """Return (order_id, sequence) for the next order of a restaurant."""
+        block_size = int(current_app.config.get('ORDER_NUMBER_BLOCK_SIZE', 1))
+        if block_size <= 1:
+            code, sequence, _ = reserve_order_numbers(db.session.connection(), restaurant_id)
+            return format_order_id(code, sequence), sequence
+
+        with self._lock:
+            block = self._blocks.get(restaurant_id)
+            if not block or block[1] > block[2]:
+                # Reserve in a separate transaction so the counter row is only
+                # locked for the duration of this one statement.
+                with db.engine.begin() as connection:
+                    block = list(reserve_order_numbers(connection, restaurant_id, block_size))
+                self._blocks[restaurant_id] = block
+            code, sequence = block[0], block[1]
+            block[1] += 1
+        return format_order_id(code, sequence), sequence
+
+    def reset(self, restaurant_id=None):
+        """Drop reserved blocks, e.g. after a restaurant's code was changed."""
+        with self._lock:
+            if restaurant_id is None:
+                self._blocks.clear()
+            else:
+                self._blocks.pop(restaurant_id, None)
+
+
+allocator = OrderNumberAllocator()
@@ -0,0 +1,127 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from extensions import *
+from werkzeug.security import check_password_hash
+import bcrypt as pybcrypt
+
+
+logger = logging.getLogger(__name__)
+
+
+# =====================
+# Password hashing
+# =====================
+# Every bcrypt hash and check (login, register, the admin user form) runs on
+# one pool of PASSWORD_HASH_WORKERS threads (default: one per core; bcrypt
+# releases the GIL while it works). The request thread waits for its hash,
+# so at most PASSWORD_HASH_QUEUE requests per process may be hashing or
+# waiting at once; past that PasswordHasherBusy is raised at once and the
+# caller answers 503. The limit only keeps page requests served while a login
+# burst runs if it stays below WEB_THREADS, the number of requests a web
+# process serves at once (gunicorn --threads); by default it is half of them.
+#
+# The work factor is BCRYPT_LOG_ROUNDS. A successful login with a hash made
+# at another work factor, or a werkzeug hash from the old admin form, hands
+# back a fresh bcrypt hash for the caller to store.
+#
+#     python bench_passwords.py --rounds 12 --clients 64
+
+BCRYPT_PREFIXES = ('$2a$', '$2b$', '$2y$')
+
+
+class PasswordHasherBusy(Exception):
+    """Too many password hashes are running or waiting already."""
+
+
+def _secret(password):
+    # bcrypt only ever used the first 72 bytes, newer versions refuse longer input
+    return password.encode('utf-8')[:72]
+
+
+def _hash(password, rounds):
+    return pybcrypt.hashpw(_secret(password), pybcrypt.gensalt(rounds)).decode('ascii')
+
+
+def _verify(password, stored, rounds):
+    if stored.startswith(BCRYPT_PREFIXES):
+        try:
+            valid = pybcrypt.checkpw(_secret(password), stored.encode('ascii'))
+        except ValueError:
+            valid = False
+        current = stored[4:6] == f"{rounds:02d}"
+    else:
+        valid = check_password_hash(stored, password)
+        current = False
+    return valid, _hash(password, rounds) if valid and not current else None
+
+
+class PasswordHasher:
+    def __init__(self, app=None):
+        self.app = None
+        self._executor = None
+        self._slots = None
+        self._workers = None
+        self._lock = threading.Lock()
+        self.rejected = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['password_hasher'] = self
+
+    @property
+    def rounds(self):
+        return self.app.config.get('BCRYPT_LOG_ROUNDS', 12)
+
+    @property
+    def workers(self):
+        """Hashes that run at once, never more than PASSWORD_HASH_QUEUE."""
+        self._start()
+        return self._workers
+
+    def _start(self):
+        with self._lock:
+            if self._executor is None:
+                web_threads = self.app.config.get('WEB_THREADS', 8)
+                limit = self.app.config.get('PASSWORD_HASH_QUEUE') or max(1, web_threads // 2)
+                if limit >= web_threads:
+                    logger.warning("PASSWORD_HASH_QUEUE=%d is not below WEB_THREADS=%d, a login burst "
+                                   "can take every request thread", limit, web_threads)
+                self._workers = min(self.app.config.get('PASSWORD_HASH_WORKERS') or os.cpu_count() or 1, limit)
+                self._slots = threading.BoundedSemaphore(limit)
+                self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix='password-hash')
+
+    def _reject(self):
+        with self._lock:
+            self.rejected += 1
+        raise PasswordHasherBusy()
+
+    def _run(self, fn, *args):
+        if self._executor is None:
+            self._start()
+        if not self._slots.acquire(blocking=False):
+            self._reject()
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.app.config.get('PASSWORD_HASH_TIMEOUT', 10))
+        except TimeoutError:
+            self._reject()
+
+    def hash(self, password):
+        """A bcrypt hash of password at the configured work factor."""
+        return self._run(_hash, password, self.rounds)
+
+    def verify(self, password, stored):
+        """Check password against a stored hash. Returns (valid, new hash to store or None)."""
+        return self._run(_verify, password, stored or '', self.rounds)
+
+
+password_hasher = PasswordHasher()
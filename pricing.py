@@ -0,0 +1,185 @@
+import threading
+import time
+from decimal import Decimal, ROUND_HALF_UP
+from extensions import *
+from models import Menu, ExtraCharges, PromoCode, PromoCodeType
+
+
+CENTS = Decimal('0.01')
+DELIVERY_FEES = {
+    'standard': 'Standard Fee',
+    'express': 'Express Fee',
+}
+
+
+def to_money(value):
+    return Decimal(value).quantize(CENTS, rounding=ROUND_HALF_UP)
+
+
+# =====================
+# Menu price index
+# =====================
+# A process-wide snapshot of every menu item's price and availability plus the
+# extra charges, so repricing a bucket is a few dict lookups instead of a query
+# per item. It is rebuilt after MenuModelView/ExtraChargesModelView writes in
+# this process and at most PRICE_INDEX_TTL seconds after writes in another one.
+
+class PriceSnapshot:
+    def __init__(self, items, charges, loaded_at):
+        self.items = items  # menu_id -> (restaurant_id, name, price, is_available)
+        self.charges = charges  # charge_name -> value
+        self.loaded_at = loaded_at
+
+
+class MenuPriceIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    def snapshot(self):
+        snapshot = self._snapshot
+        ttl = current_app.config.get('PRICE_INDEX_TTL', 60)
+        if snapshot is None or time.monotonic() - snapshot.loaded_at > ttl:
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is None or time.monotonic() - snapshot.loaded_at > ttl:
+                    snapshot = self._snapshot = self._load()
+        return snapshot
+
+    def invalidate(self):
+        self._snapshot = None
+
+    def _load(self):
+        rows = db.session.query(Menu.id, Menu.restaurant_id, Menu.name, Menu.price, Menu.is_available).all()
+        items = {row.id: (row.restaurant_id, row.name, to_money(row.price), row.is_available) for row in rows}
+        charges = {row.charge_name: to_money(row.value)
+                   for row in db.session.query(ExtraCharges.charge_name, ExtraCharges.value)}
+        return PriceSnapshot(items, charges, time.monotonic())
+
+
+price_index = MenuPriceIndex()
+
+
+# =====================
+# Quotes
+# =====================
+
+class Quote:
+    """Server side price of a bucket. Prices sent by the browser are ignored."""
+
+    def __init__(self, restaurant_id):
+        self.restaurant_id = restaurant_id
+        self.lines = []
+        self.unavailable = []  # menu ids that are unknown, unavailable or from another restaurant
+        self.subtotal = to_money(0)
+        self.delivery_fee = to_money(0)
+        self.discount = to_money(0)
+        self.promo_code = None
+        self.promo_error = None
+
+    @property
+    def total(self):
+        return self.subtotal + self.delivery_fee - self.discount
+
+    @property
+    def is_orderable(self):
+        return bool(self.lines) and not self.unavailable
+
+    def to_dict(self):
+        return {
+            'restaurant_id': self.restaurant_id,
+            'items': [dict(line, price=float(line['price']), line_total=float(line['line_total']))
+                      for line in self.lines],
+            'unavailable': self.unavailable,
+            'subtotal': float(self.subtotal),
+            'delivery_fee': float(self.delivery_fee),
+            'discount': float(self.discount),
+            'total': float(self.total),
+            'promo_code': self.promo_code,
+            'promo_error': self.promo_error,
+        }
+
+
+def bucket_menu_id(item):
+    # The menu page sends 'id', stored orders use 'menu_id'
+    menu_id = item.get('menu_id', item.get('id'))
+    return int(menu_id) if menu_id is not None else None
+
+
+def _price_bucket(bucket, delivery_type, promo, snapshot):
+    try:
+        restaurant_id = int(bucket[0].get('restaurant_id')) if bucket else None
+    except (AttributeError, TypeError, ValueError):
+        restaurant_id = None
+    quote = Quote(restaurant_id)
+    for item in bucket:
+        try:
+            menu_id = bucket_menu_id(item)
+            quantity = int(item.get('quantity', 1))
+        except (AttributeError, TypeError, ValueError):
+            continue  # Not an item at all, or no usable id and quantity
+        if quantity <= 0:
+            continue
+        entry = snapshot.items.get(menu_id)
+        if entry is None or not entry[3] or entry[0] != restaurant_id:
+            quote.unavailable.append(menu_id)
+            continue
+        _, name, price, _ = entry
+        line_total = price * quantity
+        quote.lines.append({
+            'id': menu_id,
+            'menu_id': menu_id,
+            'name': name,
+            'price': price,
+            'quantity': quantity,
+            'line_total': line_total,
+            'restaurant_id': restaurant_id,
+        })
+        quote.subtotal += line_total
+
+    if delivery_type in DELIVERY_FEES:
+        quote.delivery_fee = snapshot.charges.get(DELIVERY_FEES[delivery_type], to_money(0))
+
+    if promo is not None:
+        _apply_promo(quote, promo)
+    return quote
+
+
+def _apply_promo(quote, promo):
+    if promo is False:
+        quote.promo_error = 'Invalid promo code'
+        return
+    if not promo.is_available or (promo.time_limit and promo.time_limit < datetime.utcnow()):
+        quote.promo_error = 'This promo code has expired'
+        return
+    if promo.restaurant_id != quote.restaurant_id:
+        quote.promo_error = 'This promo code is not valid for this restaurant'
+        return
+    base = quote.delivery_fee if promo.type == PromoCodeType.DELIVERY else quote.subtotal
+    quote.discount = to_money(base * Decimal(promo.discount_percentage) / 100)
+    quote.promo_code = promo.code
+
+
+def _promo_key(code):
+    return code.strip() if isinstance(code, str) else None
+
+
+def _load_promos(codes):
+    codes = {_promo_key(code) for code in codes} - {None, ''}
+    if not codes:
+        return {}
+    found = {promo.code: promo for promo in PromoCode.query.filter(PromoCode.code.in_(codes))}
+    return {code: found.get(code, False) for code in codes}
+
+
+def quote_bucket(bucket, delivery_type=None, promo_code=None):
+    """Reprice a bucket against the menu price index."""
+    return quote_buckets([(bucket, delivery_type, promo_code)])[0]
+
+
+def quote_buckets(requests):
+    """Reprice many (bucket, delivery_type, promo_code) tuples with one index snapshot and one promo query."""
+    snapshot = price_index.snapshot()
+    promos = _load_promos(promo_code for _, _, promo_code in requests)
+    return [_price_bucket(bucket or [], delivery_type, promos.get(_promo_key(promo_code)), snapshot)
+            for bucket, delivery_type, promo_code in requests]
@@ -0,0 +1,239 @@
+import argparse
+import gzip
+import time
+from contextlib import contextmanager
+from datetime import date
+import pandas as pd
+from sqlalchemy import select
+from extensions import *
+from models import *
+from order_export import order_filters
+
+
+# =====================
+# Admin reports
+# =====================
+# Orders (with their payment) and order items are streamed out of the database
+# CHUNK_SIZE rows at a time over a server-side cursor. Every chunk is reduced
+# with DataFrame group-bys to partial totals per restaurant and day and per
+# menu item, and appended to the orders snapshot, so memory depends on the
+# number of restaurants, days and menu items in the report, not on the number
+# of orders. A run writes into its own directory under REPORTS_DIR:
+#
+#     orders.*   every order in range, one row per order
+#     daily.*    orders, revenue, items and average basket per restaurant and day
+#     items.*    quantity, revenue and popularity rank per menu item
+#     report.json  filters, row counts and how long each stage took
+#
+#     python reports.py --format parquet --since 2026-09-01 --until 2026-09-30
+#
+# Parquet needs pyarrow; csv (gzip compressed) works with pandas alone.
+
+CHUNK_SIZE = 10000
+REPORT_FORMATS = ('csv', 'parquet')
+
+
+class StageTimer:
+    """Wall clock seconds per report stage, summed over all chunks."""
+
+    def __init__(self):
+        self.seconds = {}
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - started
+
+    def iterate(self, name, iterable):
+        """Yield from iterable, counting the time spent waiting for each item as stage name."""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+
+class SnapshotWriter:
+    """Appends DataFrame chunks to one Parquet file or gzip compressed CSV file."""
+
+    def __init__(self, path, fmt):
+        if fmt not in REPORT_FORMATS:
+            raise ValueError(f"Unknown report format: {fmt}")
+        self.fmt = fmt
+        self.path = f"{path}.parquet" if fmt == 'parquet' else f"{path}.csv.gz"
+        self.rows = 0
+        self._file = None
+        self._writer = None
+        if fmt == 'parquet':
+            try:
+                import pyarrow
+                import pyarrow.parquet
+            except ImportError:
+                raise RuntimeError("Parquet reports need pyarrow, install it or use the csv format")
+            self._pyarrow = pyarrow
+        else:
+            self._file = gzip.open(self.path, 'wt', newline='', encoding='utf-8')
+
+    def write(self, frame):
+        if self.fmt == 'parquet':
+            table = self._pyarrow.Table.from_pandas(frame, preserve_index=False)
+            if self._writer is None:
+                self._writer = self._pyarrow.parquet.ParquetWriter(self.path, table.schema)
+            else:
+                table = table.cast(self._writer.schema)
+            self._writer.write_table(table)
+        else:
+            frame.to_csv(self._file, header=self.rows == 0, index=False)
+        self.rows += len(frame)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._file is not None:
+            self._file.close()
+
+
+def read_chunks(statement, chunksize=CHUNK_SIZE):
+    """DataFrames of at most chunksize rows, read over a server-side cursor."""
+    with db.engine.connect().execution_options(stream_results=True, max_row_buffer=chunksize) as connection:
+        yield from pd.read_sql(statement, connection, chunksize=chunksize)
+
+
+def _combine(parts, keys):
+    """Add up partial group-by totals that share the same keys."""
+    if not parts:
+        return None
+    return pd.concat(parts).groupby(keys, sort=False).sum()
+
+
+def build_report(directory, fmt='csv', since=None, until=None, restaurant_id=None, chunksize=CHUNK_SIZE):
+    """Write a report snapshot into directory, archived orders included. Returns the report.json contents."""
+    os.makedirs(directory, exist_ok=True)
+    timer = StageTimer()
+
+    # Orders and payments, archived ones first
+    def order_chunks():
+        for order_model, payment_model, _ in reversed(ORDER_TABLES):
+            orders = select(order_model.id.label('order_id'), order_model.restaurant_id, order_model.user_id,
+                            order_model.status, order_model.created_at, payment_model.amount) \
+                .outerjoin(payment_model, payment_model.order_id == order_model.id) \
+                .where(*order_filters(since, until, restaurant_id, order_model)).order_by(order_model.created_at)
+            yield from read_chunks(orders, chunksize)
+
+    daily_parts = []
+    orders_out = SnapshotWriter(os.path.join(directory, 'orders'), fmt)
+    try:
+        for chunk in timer.iterate('read orders', order_chunks()):
+            with timer.stage('aggregate orders'):
+                chunk['status'] = chunk['status'].map(lambda status: status.name if status is not None else None)
+                chunk['amount'] = pd.to_numeric(chunk['amount']).fillna(0.0)
+                chunk['created_at'] = pd.to_datetime(chunk['created_at'])
+                chunk['day'] = chunk['created_at'].dt.floor('D')
+                daily_parts.append(chunk.groupby(['restaurant_id', 'day'])
+                                   .agg(orders=('order_id', 'size'), revenue=('amount', 'sum')))
+                if len(daily_parts) > 32:
+                    daily_parts = [_combine(daily_parts, ['restaurant_id', 'day'])]
+            with timer.stage('write orders'):
+                orders_out.write(chunk.drop(columns='day'))
+    finally:
+        orders_out.close()
+
+    # Order items
+    def item_chunks():
+        for order_model, _, item_model in ORDER_TABLES:
+            items = select(item_model.order_id, item_model.menu_id, item_model.name, item_model.price,
+                           item_model.quantity, order_model.restaurant_id, order_model.created_at) \
+                .join(order_model, order_model.id == item_model.order_id) \
+                .where(*order_filters(since, until, restaurant_id, order_model))
+            yield from read_chunks(items, chunksize)
+
+    item_parts = []
+    basket_parts = []
+    for chunk in timer.iterate('read items', item_chunks()):
+        with timer.stage('aggregate items'):
+            chunk['price'] = pd.to_numeric(chunk['price'])
+            chunk['revenue'] = chunk['price'] * chunk['quantity']
+            chunk['day'] = pd.to_datetime(chunk['created_at']).dt.floor('D')
+            basket_parts.append(chunk.groupby(['restaurant_id', 'day']).agg(items=('quantity', 'sum')))
+            item_parts.append(chunk.dropna(subset=['menu_id']).groupby(['menu_id', 'restaurant_id'])
+                              .agg(quantity=('quantity', 'sum'), revenue=('revenue', 'sum'),
+                                   orders=('order_id', 'size')))
+            if len(item_parts) > 32:
+                item_parts = [_combine(item_parts, ['menu_id', 'restaurant_id'])]
+                basket_parts = [_combine(basket_parts, ['restaurant_id', 'day'])]
+
+    with timer.stage('summarize'):
+        columns = ['restaurant_id', 'day', 'orders', 'revenue', 'items', 'avg_basket', 'avg_items']
+        daily = _combine(daily_parts, ['restaurant_id', 'day'])
+        if daily is None:
+            daily = pd.DataFrame(columns=columns)
+        else:
+            basket = _combine(basket_parts, ['restaurant_id', 'day'])
+            daily = daily.join(basket, how='left') if basket is not None else daily.assign(items=0)
+            daily['items'] = daily['items'].fillna(0).astype('int64')
+            daily['avg_basket'] = (daily['revenue'] / daily['orders']).round(2)
+            daily['avg_items'] = (daily['items'] / daily['orders']).round(2)
+            daily = daily.reset_index().sort_values(['day', 'restaurant_id'])[columns]
+
+        columns = ['rank', 'menu_id', 'name', 'restaurant_id', 'quantity', 'revenue', 'orders', 'share']
+        popularity = _combine(item_parts, ['menu_id', 'restaurant_id'])
+        if popularity is None:
+            popularity = pd.DataFrame(columns=columns)
+        else:
+            popularity = popularity.reset_index().sort_values('quantity', ascending=False)
+            popularity['menu_id'] = popularity['menu_id'].astype('int64')
+            names = dict(db.session.query(Menu.id, Menu.name).filter(Menu.id.in_(popularity['menu_id'].tolist())))
+            popularity['name'] = popularity['menu_id'].map(names)
+            popularity['rank'] = popularity.groupby('restaurant_id')['quantity'] \
+                .rank(method='min', ascending=False).astype('int64')
+            popularity['share'] = (popularity['quantity'] /
+                                   popularity.groupby('restaurant_id')['quantity'].transform('sum')).round(4)
+            popularity = popularity[columns]
+
+    with timer.stage('write summaries'):
+        written = {'orders': {'file': os.path.basename(orders_out.path), 'rows': orders_out.rows}}
+        for name, frame in (('daily', daily), ('items', popularity)):
+            out = SnapshotWriter(os.path.join(directory, name), fmt)
+            try:
+                out.write(frame)
+            finally:
+                out.close()
+            written[name] = {'file': os.path.basename(out.path), 'rows': out.rows}
+
+    report = {
+        'generated_at': datetime.utcnow().isoformat(),
+        'format': fmt,
+        'filters': {'since': since.isoformat() if since else None, 'until': until.isoformat() if until else None,
+                    'restaurant_id': restaurant_id},
+        'totals': {'orders': int(daily['orders'].sum()), 'revenue': round(float(daily['revenue'].sum()), 2)},
+        'files': written,
+        'timings': {name: round(seconds, 3) for name, seconds in timer.seconds.items()},
+    }
+    with open(os.path.join(directory, 'report.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write an orders and sales report snapshot')
+    parser.add_argument('--format', choices=REPORT_FORMATS, default='csv')
+    parser.add_argument('--since', type=date.fromisoformat, help='first day (default: first order)')
+    parser.add_argument('--until', type=date.fromisoformat, help='last day (default: last order)')
+    parser.add_argument('--restaurant-id', type=int)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--output', help='directory to write into (default: REPORTS_DIR/<timestamp>)')
+    args = parser.parse_args()
+    from setup import create_app
+    app = create_app()
+    with app.app_context():
+        output = args.output or os.path.join(app.config['REPORTS_DIR'], datetime.utcnow().strftime('%Y%m%d-%H%M%S'))
+        report = build_report(output, args.format, args.since, args.until, args.restaurant_id, args.chunk_size)
+        print(f"Report written to {output}")
+        for name, seconds in report['timings'].items():
+            print(f"  {name:18} {seconds:8.3f}s")
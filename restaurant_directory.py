@@ -0,0 +1,58 @@
+import collections
+import hashlib
+import threading
+import time
+from extensions import *
+from models import Restaurant
+
+
+# =====================
+# Restaurant directory
+# =====================
+# Every page lists the restaurants (the drawer in basic.html, the home page)
+# and /api/restaurants serves the same list. It is loaded once per process
+# into a version-stamped snapshot holding both the rows for the templates and
+# the serialized JSON body for the API, whose ETag is a hash of those bytes.
+# RestaurantModelView drops the snapshot after every write; changes made by
+# another process show up after RESTAURANT_DIRECTORY_TTL seconds.
+
+RestaurantEntry = collections.namedtuple('RestaurantEntry', ('id', 'name', 'code'))
+
+
+class DirectorySnapshot:
+    def __init__(self, restaurants, version, body, loaded_at):
+        self.restaurants = restaurants
+        self.version = version
+        self.body = body
+        self.etag = hashlib.sha1(body).hexdigest()
+        self.loaded_at = loaded_at
+
+
+class RestaurantDirectory:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._version = 0
+
+    def snapshot(self):
+        snapshot = self._snapshot
+        ttl = current_app.config.get('RESTAURANT_DIRECTORY_TTL', 300)
+        if snapshot is None or time.monotonic() - snapshot.loaded_at > ttl:
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is None or time.monotonic() - snapshot.loaded_at > ttl:
+                    snapshot = self._snapshot = self._load()
+        return snapshot
+
+    def invalidate(self):
+        self._snapshot = None
+
+    def _load(self):
+        rows = db.session.query(Restaurant.id, Restaurant.name, Restaurant.code).order_by(Restaurant.id).all()
+        restaurants = tuple(RestaurantEntry(row.id, row.name, row.code) for row in rows)
+        body = current_app.json.dumps([{'id': entry.id, 'name': entry.name} for entry in restaurants]).encode('utf-8')
+        self._version += 1
+        return DirectorySnapshot(restaurants, self._version, body, time.monotonic())
+
+
+restaurant_directory = RestaurantDirectory()
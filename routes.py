@@ -1,6 +1,24 @@
 from extensions import *
 from models import *
 from forms import *
+from upload_jobs import queue_payment_slip, upload_workers
+from pricing import quote_bucket
+from bucket import load_bucket, store_bucket, clear_bucket, apply_bucket_ops, bucket_totals, bucket_version, BucketConflict
+from dashboard import load_dashboard_page, dashboard_counts, attach_menu_items, bulk_update_orders, status_change, parse_rider_id, order_items_from_json, DASHBOARD_VIEWS, PAST_STATUSES
+from order_events import order_events
+from sales_rollups import record_order, record_delivered, sales_today
+from order_export import export_orders_csv
+from order_archive import find_order, load_order_history, order_summary
+from menu_cache import menu_cache
+from restaurant_directory import restaurant_directory
+from passwords import password_hasher, PasswordHasherBusy
+from user_cache import user_cache
+from accounts import check_available
+from sqlalchemy.exc import IntegrityError
+from db_pool import pool_metrics
+import time
+from datetime import date
+from werkzeug.exceptions import RequestEntityTooLarge
 from flask import jsonify, request
 
 
@@ -17,6 +35,13 @@ routes_bp = Blueprint('routes', __name__)
 def home():
     return render_template('home.html', user=current_user)
 
+def hashing_busy(template, **context):
+    # Password hashing is at capacity, fail fast instead of queueing (see passwords.py)
+    flash('Too many people are signing in right now. Please try again in a moment.', 'danger')
+    response = make_response(render_template(template, **context), 503)
+    response.headers['Retry-After'] = '2'
+    return response
+
 # =====================
 # Login Page
 # =====================
@@ -28,7 +53,16 @@ def login():
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(username=form.username.data).first()
-        if user and bcrypt.check_password_hash(user.password, form.password.data):
+        try:
+            valid, new_hash = password_hasher.verify(form.password.data, user.password) if user else (False, None)
+        except PasswordHasherBusy:
+            return hashing_busy('login.html', form=form)
+        if valid:
+            if new_hash:
+                # Made at another work factor or by werkzeug, store the current kind of hash
+                user.password = new_hash
+                db.session.commit()
+                user_cache.invalidate(user.id)
             login_user(user)
             flash('Login successful!', 'success')
             # Redirect based on role
@@ -45,8 +79,11 @@ def login():
 @routes_bp.route('/register', methods=['POST', 'GET'])
 def register():
     form = RegisterForm()
-    if form.validate_on_submit():
-        hashed_password = bcrypt.generate_password_hash(form.password.data).decode('utf-8')
+    if form.validate_on_submit() and check_available(form):
+        try:
+            hashed_password = password_hasher.hash(form.password.data)
+        except PasswordHasherBusy:
+            return hashing_busy('register.html', form=form)
         new_user = User(
             username=form.username.data,
             email=form.email.data,
@@ -55,7 +92,14 @@ def register():
             role=Role.USER  # Default role is USER
         )
         db.session.add(new_user)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Taken between the check and the insert, the unique constraints caught it
+            db.session.rollback()
+            if check_available(form):
+                form.form_errors.append('Your account could not be created. Please try again.')
+            return render_template('register.html', form=form)
         flash('Account created! You can now log in.', 'success')
         return redirect(url_for('routes.login'))
     return render_template('register.html', form=form)
@@ -76,7 +120,9 @@ def logout():
 @login_required
 def menu_page(restaurant_id):
     restaurant = Restaurant.query.get_or_404(restaurant_id)
-    return render_template('menu.html', restaurant=restaurant)
+    # The menu and bucket totals go out with the page, /api/menu and /bucket are only for refreshes
+    return render_template('menu.html', restaurant=restaurant, menu=menu_cache.get(restaurant.id),
+                           bucket_totals=bucket_totals())
 
 
 
@@ -84,17 +130,15 @@ def menu_page(restaurant_id):
 @routes_bp.route('/order_details', methods=['GET', 'POST'])
 @login_required
 def order_details():
-    bucket = session.get('bucket', [])
-    for item in bucket:
-        print(f"Item: {item}")
-    total = sum(item['price'] * item['quantity'] for item in bucket)
+    quote = quote_bucket(load_bucket())
     locations = Location.query.all()
     session['can_access_checkout'] = True  # Allow access to checkout only after visiting order_details
 
     resp = make_response(render_template(
         'order_details.html',
-        bucket=bucket,
-        total=total,
+        bucket=quote.lines,
+        total=quote.subtotal,
+        unavailable=quote.unavailable,
         user=current_user,
         locations=locations
     ))
@@ -107,7 +151,7 @@ def order_details():
 @login_required
 def checkout():
     if not session.get('can_access_checkout'):
-        bucket = session.get('bucket', [])
+        bucket = load_bucket()
         restaurant_id = None
         if bucket and 'restaurant_id' in bucket[0]:
             restaurant_id = bucket[0]['restaurant_id']
@@ -119,13 +163,12 @@ def checkout():
             return redirect(url_for('routes.home'))
     session.pop('can_access_checkout', None)  # Remove flag after first access
     try:
-        bucket = session.get('bucket', [])
+        bucket = load_bucket()
         if not bucket or len(bucket) == 0:
             flash('Your bucket is empty!', 'error')
             return redirect(url_for('routes.menu_page', restaurant_id=request.form.get('restaurant_id')))
             
         if request.method == 'POST':
-            total = sum(item['price'] * item['quantity'] for item in bucket)
             delivery_type = request.form.get('delivery_type')
             location_id = request.form.get('location_id')
             special_instructions = request.form.get('special_instructions')
@@ -135,16 +178,26 @@ def checkout():
                 flash('Please select a delivery type', 'error')
                 return redirect(url_for('routes.order_details'))
                 
+            promo_code = request.form.get('promo_code')
+            quote = quote_bucket(bucket, delivery_type, promo_code)
+            if not quote.is_orderable:
+                flash('Some items in your bucket are no longer available', 'error')
+                return redirect(url_for('routes.order_details'))
+            session['can_access_checkout'] = True  # The promo code form posts back to this page
+
             # Optionally, get location name from DB
             location = Location.query.get(location_id) if location_id else None
             
             resp = make_response(render_template(
                 'checkout.html',
-                bucket=bucket,
-                total=total,
+                bucket=quote.lines,
+                total=quote.total,
+                quote=quote,
                 delivery_type=delivery_type,
                 location=location,
                 special_instructions=special_instructions,
+                promo_code=promo_code,
+                bucket_totals=bucket_totals(),
                 user=current_user
             ))
             resp.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
@@ -165,8 +218,8 @@ def checkout():
 @login_required
 def get_bucket():
     try:
-        bucket = session.get('bucket', [])
-        return jsonify({'bucket': bucket})
+        # Names and prices come from the price index, the session only has ids and quantities
+        return jsonify({'bucket': quote_bucket(load_bucket()).to_dict()['items'], 'version': bucket_version()})
     except Exception as e:
         return jsonify({'error': 'Failed to retrieve bucket'}), 500
 
@@ -178,26 +231,65 @@ def save_bucket():
         if not isinstance(bucket, list):
             return jsonify({'error': 'Invalid bucket format'}), 400
             
-        session['bucket'] = bucket
-        session.modified = True
-        return jsonify({'success': True})
+        store_bucket(bucket)
+        return jsonify({'success': True, 'quote': quote_bucket(load_bucket()).to_dict()})
     except Exception as e:
         return jsonify({'error': 'Failed to save bucket'}), 500
 
+@routes_bp.route('/bucket')
+@login_required
+def bucket_summary():
+    return jsonify(bucket_totals())
+
+# Small bucket changes from the menu page, e.g.
+# {"version": 4, "restaurant_id": 1, "ops": [{"op": "add", "id": 12, "quantity": 2}]}
+@routes_bp.route('/bucket', methods=['POST'])
+@login_required
+def update_bucket():
+    data = request.get_json(silent=True) or {}
+    ops = data.get('ops')
+    if not isinstance(ops, list) or not all(isinstance(op, dict) for op in ops):
+        return jsonify({'error': 'A list of operations is required'}), 400
+    try:
+        apply_bucket_ops(data.get('version'), data.get('restaurant_id'), ops)
+    except BucketConflict:
+        # The client is behind, it gets the current totals and version to retry against
+        return jsonify(dict(bucket_totals(), error='Bucket changed, please retry')), 409
+    except ValueError as e:
+        return jsonify(dict(bucket_totals(), error=str(e))), 400
+    return jsonify(bucket_totals())
+
 
 @routes_bp.route('/account', methods=['GET', 'POST'])
 @login_required
 def account():
     user = current_user
-    # Query the user's orders, sorted by most recent
-    orders = Order.query.filter_by(user_id=user.id).order_by(Order.created_at.desc()).all()
-    return render_template('account.html', user=user, orders=orders)
+    # First page of the user's orders (archived ones included), the rest is loaded on scroll
+    orders, next_cursor = load_order_history(user.id, limit=current_app.config.get('ORDER_HISTORY_PAGE_SIZE', 20))
+    return render_template('account.html', user=user, orders=[order_summary(order) for order in orders],
+                           next_cursor=next_cursor)
+
+@routes_bp.route('/account/orders')
+@login_required
+def account_orders():
+    try:
+        orders, next_cursor = load_order_history(current_user.id, request.args.get('cursor'),
+                                                 current_app.config.get('ORDER_HISTORY_PAGE_SIZE', 20))
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    summaries = [order_summary(order) for order in orders]
+    row = get_template_attribute('order_history_row.html', 'order_history_row')
+    response = jsonify({'html': ''.join(str(row(order)) for order in summaries), 'next_cursor': next_cursor})
+    # Admins can still edit an order, so the browser revalidates; an unchanged page is a 304
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.add_etag()
+    return response.make_conditional(request)
 
 @routes_bp.route('/create_order', methods=['POST'])
 @login_required
 def create_order():
     try:
-        bucket = session.get('bucket', [])
+        bucket = load_bucket()
         if not bucket:
             return redirect(url_for('routes.menu_page', restaurant_id=request.form.get('restaurant_id')))
 
@@ -205,80 +297,81 @@ def create_order():
         if not restaurant_id:
             return redirect(url_for('routes.menu_page', restaurant_id=restaurant_id))
 
-        # Generate order ID and create order
+        # Parsing the form streams the slip in, oversized slips are rejected
+        # as soon as they cross the limit (see storage.SlipRequest)
         try:
-            order_id = Order.generate_order_id(restaurant_id)
-            sequence = int(order_id.split('-')[1])
-        except ValueError as e:
+            file = request.files.get('payment_slip')
+        except RequestEntityTooLarge:
+            flash('Payment slip must be no more than 2.5 MB', 'error')
             return redirect(url_for('routes.checkout'))
 
-        # Create the order
+        # Reprice the bucket on the server, browser prices are never trusted
+        quote = quote_bucket(bucket, request.form.get('delivery_type'), request.form.get('promo_code'))
+        if not quote.is_orderable:
+            flash('Some items in your bucket are no longer available', 'error')
+            return redirect(url_for('routes.order_details'))
+
+        # Create the order (the order number is allocated right before the insert)
+        created_at = datetime.utcnow()
         new_order = Order(
-            id=order_id,
-            sequence=sequence,
             user_id=current_user.id,
             restaurant_id=restaurant_id,
-            items=json.dumps(bucket),
-            special_instructions=request.form.get('special_instructions')
+            items=json.dumps(quote.to_dict()['items']),
+            special_instructions=request.form.get('special_instructions'),
+            created_at=created_at
         )
+        new_order.order_items = [
+            OrderItem(menu_id=line['menu_id'], restaurant_id=restaurant_id, name=line['name'],
+                      price=line['price'], quantity=line['quantity'], created_at=created_at)
+            for line in quote.lines
+        ]
 
         # Create the payment record
-        total = sum(item['price'] * item['quantity'] for item in bucket)
         new_payment = Payment(
-            order_id=order_id,
             user_id=current_user.id,
-            amount=total
+            amount=quote.total
         )
 
-        # Handle payment slip upload
-        slip_uploaded = False
-        if 'payment_slip' in request.files:
-            file = request.files['payment_slip']
-            if file and file.filename:
-                try:
-                    # Check file size
-                    file.seek(0, os.SEEK_END)
-                    file_size = file.tell()
-                    file.seek(0)
-                    
-                    if file_size > MAX_CONTENT_LENGTH:
-                        return redirect(url_for('routes.checkout'))
-                    
-                    # Create temp directory if it doesn't exist
-                    temp_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'temp')
-                    os.makedirs(temp_dir, exist_ok=True)
-                    
-                    # Secure the filename
-                    filename = secure_filename(file.filename)
-                    temp_path = os.path.join(temp_dir, filename)
-                    file.save(temp_path)
-                    
-                    # Upload to Google Drive
-                    try:
-                        drive_file_id = upload_to_drive(temp_path, filename, FOLDER_ID)
-                        new_payment.drive_file_id = drive_file_id
-                        slip_uploaded = True
-                    except Exception as e:
-                        pass
-                    finally:
-                        # Clean up temp file
-                        if os.path.exists(temp_path):
-                            os.remove(temp_path)
-                except Exception as e:
-                    pass
-        if not slip_uploaded:
+        # Store the payment slip, the upload itself runs in the background
+        slip_job = None
+        slip_received = False
+        if file and file.filename:
+            try:
+                slip_job = queue_payment_slip(new_payment, file, current_app.config)
+                slip_received = True
+            except RequestEntityTooLarge:
+                flash('Payment slip must be no more than 2.5 MB', 'error')
+                return redirect(url_for('routes.checkout'))
+            except Exception as e:
+                slip_received = False
+        if not slip_received:
             flash('No payment slip uploaded', 'error')
 
+        # Generate order ID. This locks the restaurant's order counter until
+        # the commit below, so keep it as close to the commit as possible.
+        try:
+            order_id, sequence = Order.allocate_order_number(restaurant_id)
+        except ValueError as e:
+            db.session.rollback()
+            return redirect(url_for('routes.checkout'))
+        new_order.id = order_id
+        new_order.sequence = sequence
+        new_payment.order_id = order_id
+
         # Save to database
         try:
             db.session.add(new_order)
             db.session.add(new_payment)
+            record_order(new_order, new_payment.amount)
+            order_events.publish(new_order, 'created')
             db.session.commit()
+            if slip_job:
+                upload_workers.notify()
             # Only clear the bucket after successful database commit
-            session.pop('bucket', None)
-            session.modified = True
+            clear_bucket()
             return redirect(url_for('routes.account'))
         except Exception as e:
+            # The stored slip is kept, a retried checkout with the same file reuses it
             db.session.rollback()
             flash('Order could not be created. Please try again.', 'error')
             return redirect(url_for('routes.checkout'))
@@ -286,59 +379,36 @@ def create_order():
     except Exception as e:
         return redirect(url_for('routes.checkout'))
 
-def upload_to_drive(local_file_path, filename, folder_id):
-    try:
-        if not os.path.exists(SERVICE_ACCOUNT_FILE):
-            raise FileNotFoundError("Google Drive credentials not found")
-        
-        if not os.path.exists(local_file_path):
-            raise FileNotFoundError("File to upload not found")
-
-        creds = service_account.Credentials.from_service_account_file(
-            SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-        
-        service = build('drive', 'v3', credentials=creds)
-
-        file_metadata = {
-            'name': filename,
-            'parents': [folder_id]
-        }
-        
-        media = MediaFileUpload(local_file_path, resumable=True)
-        
-        file = service.files().create(
-            body=file_metadata,
-            media_body=media,
-            fields='id'
-        ).execute()
-        
-        return file.get('id')
-    except Exception as e:
-        raise Exception(f"Failed to upload to Google Drive: {str(e)}")
-
 @routes_bp.route('/order_details/<order_id>')
 @login_required
 def get_order_details(order_id):
     try:
-        order = Order.query.get_or_404(order_id)
+        order = find_order(order_id)
+        if order is None:
+            return jsonify({'error': 'Order not found'}), 404
         # Ensure user can only view their own orders
         if order.user_id != current_user.id:
             return jsonify({'error': 'Unauthorized'}), 403
             
-        return jsonify({
+        response = jsonify({
             'id': order.id,
             'created_at': order.created_at.isoformat(),
             'status': order.status.value,
-            'items': order.items,
+            'items': [{'menu_id': item.menu_id, 'name': item.name, 'price': float(item.price),
+                       'quantity': item.quantity}
+                      for item in order.order_items or order_items_from_json(order)],
             'special_instructions': order.special_instructions
         })
+        # Admins can still edit an order, so the browser revalidates; an unchanged order is a 304
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.add_etag()
+        return response.make_conditional(request)
     except Exception as e:
         return jsonify({'error': 'Failed to retrieve order details'}), 500
 
 @routes_bp.app_context_processor
 def inject_restaurants():
-    from models import Restaurant
-    return {'restaurants': Restaurant.query.all()}
+    return {'restaurants': restaurant_directory.snapshot().restaurants}
 
 @routes_bp.route('/admin/orderdashboard')
 @login_required
@@ -346,24 +416,94 @@ def admin_order_dashboard():
     if not getattr(current_user, 'role', None) == Role.ADMIN:
         flash('You are not authorized to access this page.', 'danger')
         return redirect(url_for('routes.login'))
-    restaurants = Restaurant.query.all()
-    orders = Order.query.options(db.joinedload(Order.user), db.joinedload(Order.rider)).all()
+    restaurants = Restaurant.query.order_by(Restaurant.id).all()
+    if not restaurants:
+        return render_template('orders_dashboard.html', restaurants=[], orders=[], riders=[], counts={})
+
+    restaurant_id = request.args.get('restaurant_id', type=int) or restaurants[0].id
+    view = request.args.get('view', 'current')
+    if view not in DASHBOARD_VIEWS:
+        view = 'current'
+    orders, next_cursor = load_dashboard_page(restaurant_id, view, request.args.get('cursor'),
+                                              current_app.config.get('DASHBOARD_PAGE_SIZE', 50))
     riders = Rider.query.all()
-    # Attach menu_items to each order
-    for order in orders:
-        order.menu_items = []
-        try:
-            items = json.loads(order.items)
-            for item in items:
-                menu_item = Menu.query.get(item.get('menu_id'))
-                if menu_item:
-                    order.menu_items.append({
-                        'menu': menu_item,
-                        'quantity': item.get('quantity', 1)
-                    })
-        except Exception:
-            order.menu_items = []
-    return render_template('orders_dashboard.html', restaurants=restaurants, orders=orders, riders=riders)
+    return render_template('orders_dashboard.html', restaurants=restaurants, orders=orders, riders=riders,
+                           counts=dashboard_counts([restaurant.id for restaurant in restaurants], restaurant_id),
+                           restaurant_id=restaurant_id, view=view,
+                           next_cursor=next_cursor, past_statuses=[status.name for status in PAST_STATUSES],
+                           order_statuses=list(OrderStatus), sales=sales_today(restaurant_id))
+
+@routes_bp.route('/admin/orderdashboard/card/<order_id>')
+@login_required
+def admin_order_card(order_id):
+    if not getattr(current_user, 'role', None) == Role.ADMIN:
+        return jsonify({'error': 'Unauthorized'}), 403
+    order = Order.query.options(db.joinedload(Order.user), db.joinedload(Order.payment)).get_or_404(order_id)
+    attach_menu_items([order])
+    order_card = get_template_attribute('order_card.html', 'order_card')
+    return order_card(order, Rider.query.all())
+
+@routes_bp.route('/admin/orderdashboard/events')
+@login_required
+def order_event_stream():
+    if not getattr(current_user, 'role', None) == Role.ADMIN:
+        return jsonify({'error': 'Unauthorized'}), 403
+    # EventSource sends Last-Event-ID when it reconnects, resume right after it
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    # Streams end after a while and the browser reconnects, so no worker is held forever
+    stream = order_events.stream(int(last_event_id) if last_event_id and last_event_id.isdigit() else None,
+                                 current_app.config.get('ORDER_EVENTS_STREAM_SECONDS', 300))
+    return Response(stream, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@routes_bp.route('/admin/export/orders.csv')
+@login_required
+def export_orders():
+    if not getattr(current_user, 'role', None) == Role.ADMIN:
+        flash('You are not authorized to access this page.', 'danger')
+        return redirect(url_for('routes.login'))
+    # ?restaurant_id=1&status=DELIVERED&status=VERIFIED&since=2026-09-01&until=2026-12-31
+    try:
+        statuses = [OrderStatus[name] for name in request.args.getlist('status') if name]
+        since = date.fromisoformat(request.args['since']) if request.args.get('since') else None
+        until = date.fromisoformat(request.args['until']) if request.args.get('until') else None
+    except (KeyError, ValueError):
+        return jsonify({'success': False, 'error': 'Invalid status or date filter'}), 400
+    restaurant_id = request.args.get('restaurant_id', type=int)
+    filename = f"orders-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.csv"
+    return Response(stream_with_context(export_orders_csv(restaurant_id, statuses, since, until)),
+                    mimetype='text/csv',
+                    headers={'Content-Disposition': f'attachment; filename={filename}', 'X-Accel-Buffering': 'no'})
+
+@routes_bp.route('/admin/pool_metrics')
+@login_required
+def admin_pool_metrics():
+    if not getattr(current_user, 'role', None) == Role.ADMIN:
+        return jsonify({'error': 'Unauthorized'}), 403
+    # Per process: every worker has its own pool, so these are this worker's numbers
+    response = jsonify(pool_metrics.snapshot(db.engine))
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@routes_bp.route('/admin/bulk_update_orders', methods=['POST'])
+@login_required
+def bulk_update_order():
+    if not getattr(current_user, 'role', None) == Role.ADMIN:
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 403
+    data = request.get_json(silent=True) or {}
+    changes = data.get('changes')
+    if not isinstance(changes, list) or not all(isinstance(change, dict) for change in changes):
+        return jsonify({'success': False, 'error': 'A list of changes is required'}), 400
+    try:
+        results = bulk_update_orders(changes)
+        return jsonify({'success': all(result['success'] for result in results.values()), 'results': results})
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception("Bulk order update failed")
+        return jsonify({'success': False, 'error': 'Could not update the orders'}), 500
 
 @routes_bp.route('/admin/update_order/<order_id>', methods=['POST'])
 @login_required
@@ -374,8 +514,12 @@ def update_order(order_id):
     if not order:
         return jsonify({'success': False, 'error': 'Order not found'}), 404
     try:
+        old_status = order.status
+        # Status changes follow the same rules as the bulk update
+        if request.form.get('status'):
+            order.status = status_change(old_status, request.form['status'])
         # Update order fields
-        for field in ['status', 'special_instructions', 'delivery_type', 'promo_code', 'promo_type', 'discount', 'reason', 'order_no', 'cost_price', 'delivery_price']:
+        for field in ['special_instructions', 'delivery_type', 'promo_code', 'promo_type', 'discount', 'reason', 'order_no', 'cost_price', 'delivery_price']:
             if field in request.form:
                 setattr(order, field, request.form[field] if request.form[field] != '' else None)
         # Update location if provided
@@ -387,13 +531,18 @@ def update_order(order_id):
                     order.location_id = location.id
         # Update rider assignment
         if 'rider_id' in request.form:
-            rider_id = request.form['rider_id']
-            order.rider_id = int(rider_id) if rider_id else None
+            order.rider_id = parse_rider_id(request.form['rider_id'])
         # Update payment amount if provided
         if 'amount' in request.form and hasattr(order, 'payment') and order.payment:
             order.payment.amount = request.form['amount']
+        record_delivered([(order.restaurant_id, order.created_at, old_status, order.status)])
+        order_events.publish(order, 'updated')
         db.session.commit()
         return jsonify({'success': True})
-    except Exception as e:
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception:
         db.session.rollback()
-        return jsonify({'success': False, 'error': str(e)})
\ No newline at end of file
+        current_app.logger.exception("Order update failed")
+        return jsonify({'success': False, 'error': 'Could not update the order'}), 500
\ No newline at end of file
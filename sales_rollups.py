@@ -0,0 +1,187 @@
+import argparse
+from datetime import date, timedelta
+from decimal import Decimal
+from extensions import *
+from models import *
+
+
+# =====================
+# Sales rollups
+# =====================
+# restaurant_sales_hourly and menu_item_sales_daily hold running totals that
+# are bumped in the same transaction as the order they count: record_order()
+# from create_order and record_delivered() whenever an order moves in or out of
+# DELIVERED. Both are keyed by when the order was placed, so rebuild() can
+# recompute any day from order/order_item/payment (and their archive tables)
+# and get the same numbers; run it after a backfill or if the totals are ever
+# in doubt:
+#
+#     python sales_rollups.py                       # everything
+#     python sales_rollups.py --since 2026-10-01 --until 2026-10-17
+#
+# restaurant.total_orders is the order number counter (see order_numbers.py) and
+# already goes up in the same transaction as every order; rebuild() only makes
+# sure it is never behind the highest sequence handed out.
+#
+# rebuild() stops at yesterday: today's rows are still being bumped by new
+# orders, and an increment committed between rebuild reading the orders and
+# rewriting the rows would be lost. Orders of earlier days can still change
+# status, so rebuild reads them with SELECT ... FOR UPDATE; a status change
+# running at the same time waits for the rewrite (or the rewrite waits for it)
+# instead of being overwritten.
+
+def hour_of(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def _increment(model, keys, deltas, insert_only=None):
+    """Upsert one rollup row, adding deltas to its counters.
+
+    insert_only columns are only written when the row is created.
+    """
+    table = model.__table__
+    insert_only = insert_only or {}
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(table).values(**keys, **insert_only, **deltas)
+        stmt = stmt.on_duplicate_key_update({name: table.c[name] + stmt.inserted[name] for name in deltas})
+    else:
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table).values(**keys, **insert_only, **deltas)
+        stmt = stmt.on_conflict_do_update(index_elements=list(keys),
+                                          set_={name: table.c[name] + stmt.excluded[name] for name in deltas})
+    db.session.execute(stmt)
+
+
+def record_order(order, amount):
+    """Count a new order (with its order_items set) in the rollups. Committed by the caller."""
+    _increment(RestaurantSalesHourly, {'restaurant_id': order.restaurant_id, 'hour': hour_of(order.created_at)},
+               {'orders': 1, 'items': sum(item.quantity for item in order.order_items),
+                'revenue': Decimal(amount), 'delivered_orders': 0})
+    day = order.created_at.date()
+    for item in order.order_items:
+        if item.menu_id is None:
+            continue
+        _increment(MenuItemSalesDaily, {'menu_id': item.menu_id, 'day': day},
+                   {'quantity': item.quantity, 'revenue': Decimal(item.price) * item.quantity},
+                   insert_only={'restaurant_id': order.restaurant_id})
+
+
+def record_delivered(changes):
+    """Move orders in or out of the delivered counts. Committed by the caller.
+
+    changes is an iterable of (restaurant_id, created_at, old_status, new_status).
+    """
+    deltas = {}
+    for restaurant_id, created_at, old_status, new_status in changes:
+        key = (restaurant_id, hour_of(created_at))
+        deltas[key] = deltas.get(key, 0) + (new_status == OrderStatus.DELIVERED) - (old_status == OrderStatus.DELIVERED)
+    for (restaurant_id, hour), delta in deltas.items():
+        if delta:
+            _increment(RestaurantSalesHourly, {'restaurant_id': restaurant_id, 'hour': hour},
+                       {'orders': 0, 'items': 0, 'revenue': Decimal(0), 'delivered_orders': delta})
+
+
+def rebuild(since=None, until=None):
+    """Recompute the rollups for every day from since to until (dates, inclusive).
+
+    Each day is deleted and rewritten in its own transaction, so running it
+    again for the same range gives the same rows. until defaults to yesterday
+    (UTC), and a later day is refused: today's rows are still being written.
+    """
+    last_closed = datetime.utcnow().date() - timedelta(days=1)
+    until = until or last_closed
+    if until > last_closed:
+        raise ValueError(f"Can only rebuild up to {last_closed}, today's rollups are still being written")
+    if since is None:
+        firsts = [db.session.query(db.func.min(order_model.created_at)).scalar() for order_model, _, _ in ORDER_TABLES]
+        firsts = [first for first in firsts if first]
+        since = min(firsts).date() if firsts else until
+    day = since
+    while day <= until:
+        _rebuild_day(day)
+        day += timedelta(days=1)
+    _sync_total_orders()
+
+
+def _rebuild_day(day):
+    start = datetime.combine(day, datetime.min.time())
+    end = start + timedelta(days=1)
+
+    hourly = {}
+    daily = {}
+    for order_model, payment_model, item_model in ORDER_TABLES:
+        # Locked until the rewrite commits, so no status change of these orders slips in between
+        orders = db.session.query(order_model.id, order_model.restaurant_id, order_model.status,
+                                  order_model.created_at, payment_model.amount) \
+            .outerjoin(payment_model, payment_model.order_id == order_model.id) \
+            .filter(order_model.created_at >= start, order_model.created_at < end) \
+            .with_for_update(of=order_model)
+        for order in orders:
+            row = hourly.setdefault((order.restaurant_id, hour_of(order.created_at)),
+                                    {'orders': 0, 'items': 0, 'revenue': Decimal(0), 'delivered_orders': 0})
+            row['orders'] += 1
+            row['revenue'] += order.amount or 0
+            row['delivered_orders'] += order.status == OrderStatus.DELIVERED
+
+        items = db.session.query(item_model.menu_id, item_model.price, item_model.quantity,
+                                 order_model.restaurant_id, order_model.created_at) \
+            .join(order_model, order_model.id == item_model.order_id) \
+            .filter(order_model.created_at >= start, order_model.created_at < end)
+        for item in items:
+            hourly[(item.restaurant_id, hour_of(item.created_at))]['items'] += item.quantity
+            if item.menu_id is None:
+                continue
+            row = daily.setdefault(item.menu_id, {'restaurant_id': item.restaurant_id,
+                                                  'quantity': 0, 'revenue': Decimal(0)})
+            row['quantity'] += item.quantity
+            row['revenue'] += item.price * item.quantity
+
+    RestaurantSalesHourly.query.filter(RestaurantSalesHourly.hour >= start,
+                                       RestaurantSalesHourly.hour < end).delete(synchronize_session=False)
+    MenuItemSalesDaily.query.filter(MenuItemSalesDaily.day == day).delete(synchronize_session=False)
+    db.session.bulk_insert_mappings(RestaurantSalesHourly, [
+        dict(row, restaurant_id=restaurant_id, hour=hour) for (restaurant_id, hour), row in hourly.items()])
+    db.session.bulk_insert_mappings(MenuItemSalesDaily, [
+        dict(row, menu_id=menu_id, day=day) for menu_id, row in daily.items()])
+    db.session.commit()
+
+
+def _sync_total_orders():
+    highest = {}
+    for order_model, _, _ in ORDER_TABLES:
+        for restaurant_id, sequence in db.session.query(order_model.restaurant_id, db.func.max(order_model.sequence)) \
+                .group_by(order_model.restaurant_id):
+            highest[restaurant_id] = max(sequence, highest.get(restaurant_id, 0))
+    for restaurant_id, sequence in highest.items():
+        Restaurant.query.filter(Restaurant.id == restaurant_id, Restaurant.total_orders < sequence) \
+            .update({'total_orders': sequence}, synchronize_session=False)
+    db.session.commit()
+
+
+def sales_today(restaurant_id):
+    """Today's (UTC) totals of a restaurant from the hourly rollup."""
+    start = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+    totals = db.session.query(
+        db.func.coalesce(db.func.sum(RestaurantSalesHourly.orders), 0),
+        db.func.coalesce(db.func.sum(RestaurantSalesHourly.revenue), 0),
+        db.func.coalesce(db.func.sum(RestaurantSalesHourly.delivered_orders), 0),
+    ).filter(RestaurantSalesHourly.restaurant_id == restaurant_id, RestaurantSalesHourly.hour >= start).one()
+    return {'orders': int(totals[0]), 'revenue': Decimal(totals[1]), 'delivered_orders': int(totals[2])}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rebuild the sales rollup tables')
+    parser.add_argument('--since', type=date.fromisoformat, help='first day to rebuild (default: first order)')
+    parser.add_argument('--until', type=date.fromisoformat, help='last day to rebuild (default: yesterday)')
+    args = parser.parse_args()
+    from setup import create_app
+    with create_app().app_context():
+        try:
+            rebuild(args.since, args.until)
+        except ValueError as e:
+            parser.error(str(e))
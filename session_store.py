@@ -0,0 +1,323 @@
+import collections
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SecureCookieSession
+from extensions import *
+
+
+# =====================
+# Server-side sessions
+# =====================
+# The session cookie only carries a random session id; the session itself
+# (login, CSRF token, flashes, the bucket) is kept on the server by one of the
+# SESSION_BACKEND stores:
+#
+#     'sqlite'  a local SQLite file (SESSION_SQLITE_PATH), shared by every
+#               worker process on the machine. The default.
+#     'redis'   any Redis compatible server at SESSION_REDIS_URL (needs redis-py)
+#     'memory'  an in-process stand-in for Redis, for tests and single-process
+#               setups; sessions are lost on restart
+#
+# A session is only written when it changed, and requests for static files
+# never read it. Sessions expire PERMANENT_SESSION_LIFETIME after their last
+# write.
+#
+# The session is read when a request starts and written back whole when it
+# ends, so two requests of one session running at once overwrite each other.
+# That is fine for a login or a flash, not for the bucket: it is kept next to
+# the session under the same id, with a version, and every write is a
+# compare-and-set on that version (an UPDATE ... WHERE version = ? in SQLite,
+# WATCH/MULTI in Redis). See bucket.py.
+
+try:
+    from redis.exceptions import WatchError as RedisWatchError
+except ImportError:
+    RedisWatchError = None
+
+
+class WatchError(Exception):
+    """A watched key changed before a LocalRedis transaction ran."""
+
+class ServerSession(SecureCookieSession):
+    def __init__(self, initial=None, sid=None, new=False):
+        super().__init__(initial)
+        self.sid = sid
+        self.new = new
+
+
+class SQLiteSessionBackend:
+    """Sessions in a SQLite file, one connection per thread."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("CREATE TABLE IF NOT EXISTS session "
+                           "(id TEXT PRIMARY KEY, data BLOB NOT NULL, expires_at INTEGER NOT NULL)")
+        connection.execute("CREATE TABLE IF NOT EXISTS session_bucket (id TEXT PRIMARY KEY, "
+                           "version INTEGER NOT NULL, data BLOB NOT NULL, expires_at INTEGER NOT NULL)")
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        return connection
+
+    def get(self, sid):
+        row = self._connection().execute("SELECT data FROM session WHERE id = ? AND expires_at > ?",
+                                         (sid, int(time.time()))).fetchone()
+        return row[0] if row else None
+
+    def set(self, sid, data, ttl):
+        connection = self._connection()
+        connection.execute("INSERT OR REPLACE INTO session (id, data, expires_at) VALUES (?, ?, ?)",
+                           (sid, data, int(time.time()) + ttl))
+        self._writes += 1
+        if self._writes % 1000 == 0:
+            connection.execute("DELETE FROM session WHERE expires_at <= ?", (int(time.time()),))
+            connection.execute("DELETE FROM session_bucket WHERE expires_at <= ?", (int(time.time()),))
+
+    def delete(self, sid):
+        connection = self._connection()
+        connection.execute("DELETE FROM session WHERE id = ?", (sid,))
+        connection.execute("DELETE FROM session_bucket WHERE id = ?", (sid,))
+
+    def get_bucket(self, sid):
+        """(version, data) of the session's bucket, or None."""
+        row = self._connection().execute("SELECT version, data FROM session_bucket WHERE id = ? AND expires_at > ?",
+                                         (sid, int(time.time()))).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def set_bucket(self, sid, expected_version, data, ttl):
+        """Store data as version expected_version + 1 if the bucket is still at expected_version."""
+        now = int(time.time())
+        if expected_version:
+            cursor = self._connection().execute(
+                "UPDATE session_bucket SET version = ?, data = ?, expires_at = ? "
+                "WHERE id = ? AND version = ? AND expires_at > ?",
+                (expected_version + 1, data, now + ttl, sid, expected_version, now))
+        else:
+            # No bucket yet, or only an expired one
+            cursor = self._connection().execute(
+                "INSERT INTO session_bucket (id, version, data, expires_at) VALUES (?, 1, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET version = 1, data = excluded.data, expires_at = excluded.expires_at "
+                "WHERE session_bucket.expires_at <= ?",
+                (sid, data, now + ttl, now))
+        return cursor.rowcount == 1
+
+
+class RedisSessionBackend:
+    """Sessions in a Redis compatible client (get, set with ex, delete)."""
+
+    def __init__(self, client, prefix='session:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, sid):
+        return self.client.get(self.prefix + sid)
+
+    def set(self, sid, data, ttl):
+        self.client.set(self.prefix + sid, data, ex=ttl)
+
+    def delete(self, sid):
+        self.client.delete(self.prefix + sid, self.prefix + sid + ':bucket')
+
+    def get_bucket(self, sid):
+        """(version, data) of the session's bucket, or None."""
+        return self._split(self.client.get(self.prefix + sid + ':bucket'))
+
+    def set_bucket(self, sid, expected_version, data, ttl):
+        """Store data as version expected_version + 1 if the bucket is still at expected_version."""
+        key = self.prefix + sid + ':bucket'
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                current = self._split(pipe.get(key))
+                if (current[0] if current else 0) != expected_version:
+                    pipe.unwatch()
+                    return False
+                pipe.multi()
+                pipe.set(key, b'%d\n' % (expected_version + 1) + data, ex=ttl)
+                pipe.execute()
+                return True
+            except tuple(error for error in (WatchError, RedisWatchError) if error):
+                return False  # Written by another request between WATCH and EXEC
+
+    @staticmethod
+    def _split(value):
+        if value is None:
+            return None
+        version, data = value.split(b'\n', 1)
+        return int(version), data
+
+
+class LocalRedis:
+    """In-process stand-in for the part of the Redis client the session store uses."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._data = {}  # key -> (value, expires_at)
+        self._revisions = collections.Counter()  # key -> writes, for WATCH
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[1] is not None and entry[1] <= time.monotonic():
+                del self._data[key]
+                return None
+            return entry[0]
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ex if ex else None)
+            self._revisions[key] += 1
+            if len(self._data) % 1000 == 0:
+                now = time.monotonic()
+                for expired in [name for name, (_, expires_at) in self._data.items()
+                                if expires_at is not None and expires_at <= now]:
+                    del self._data[expired]
+        return True
+
+    def delete(self, *keys):
+        with self._lock:
+            self._revisions.update(keys)
+            return sum(self._data.pop(key, None) is not None for key in keys)
+
+    def pipeline(self):
+        return LocalPipeline(self)
+
+
+class LocalPipeline:
+    """WATCH/MULTI/EXEC for LocalRedis: queued writes run only if no watched key was written meanwhile."""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self._watched = {}
+        self._queued = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._watched = {}
+        self._queued = None
+
+    def watch(self, *keys):
+        with self.redis._lock:
+            self._watched.update((key, self.redis._revisions[key]) for key in keys)
+
+    def unwatch(self):
+        self._watched = {}
+
+    def get(self, key):
+        return self.redis.get(key)
+
+    def multi(self):
+        self._queued = []
+
+    def set(self, key, value, ex=None):
+        self._queued.append((key, value, ex))
+
+    def execute(self):
+        queued, self._queued = self._queued or [], None
+        watched, self._watched = self._watched, {}
+        with self.redis._lock:
+            if any(self.redis._revisions[key] != revision for key, revision in watched.items()):
+                raise WatchError()
+            for key, value, ex in queued:
+                self.redis.set(key, value, ex)
+        return [True] * len(queued)
+
+
+
+def create_session_backend(config):
+    backend = config.get('SESSION_BACKEND', 'sqlite')
+    if backend == 'sqlite':
+        return SQLiteSessionBackend(config['SESSION_SQLITE_PATH'])
+    if backend == 'redis':
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("SESSION_BACKEND = 'redis' needs redis-py, install it or use 'sqlite'")
+        return RedisSessionBackend(redis.Redis.from_url(config['SESSION_REDIS_URL']))
+    if backend == 'memory':
+        return RedisSessionBackend(LocalRedis())
+    raise ValueError(f"Unknown SESSION_BACKEND: {backend}")
+
+
+class ServerSessionInterface(SessionInterface):
+    session_class = ServerSession
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._backend = None
+
+    def backend(self, app):
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = create_session_backend(app.config)
+        return self._backend
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if app.static_url_path and request.path.startswith(app.static_url_path + '/'):
+            return self.session_class(sid=sid)  # Never read, never saved
+        if sid:
+            data = self.backend(app).get(sid)
+            if data is not None:
+                try:
+                    return self.session_class(self.serializer.loads(data), sid=sid)
+                except ValueError:
+                    pass
+        return self.session_class(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if not session:
+            if session.modified and not session.new:
+                self.backend(app).delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path, secure=self.get_cookie_secure(app),
+                                       httponly=self.get_cookie_httponly(app),
+                                       samesite=self.get_cookie_samesite(app))
+            return
+        if not self.should_set_cookie(app, session):
+            return
+
+        ttl = int(app.permanent_session_lifetime.total_seconds())
+        self.backend(app).set(session.sid, self.serializer.dumps(dict(session)).encode('utf-8'), ttl)
+        if session.new or session.permanent:
+            response.set_cookie(name, session.sid, expires=self.get_expiration_time(app, session),
+                                domain=domain, path=path, secure=self.get_cookie_secure(app),
+                                httponly=self.get_cookie_httponly(app), samesite=self.get_cookie_samesite(app))
+
+
+class ServerSessions:
+    def __init__(self, app=None):
+        self.interface = ServerSessionInterface()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['server_sessions'] = self
+        app.session_interface = self.interface
+
+
+server_sessions = ServerSessions()
@@ -0,0 +1,179 @@
+import collections
+import logging
+import re
+import threading
+import time
+from flask import g, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from extensions import *
+
+
+logger = logging.getLogger(__name__)
+
+
+# =====================
+# SQL profiler
+# =====================
+# With SQL_PROFILER on, every statement a request runs is counted and timed
+# through the engine's cursor events, and grouped by fingerprint: the
+# statement with its literals and IN lists collapsed, so the same query run
+# for every row of a list (an N+1) shows up as one fingerprint with a high
+# count. Each response carries a Server-Timing header with the database time
+# and statement count. A request that crosses a threshold
+#
+#     SQL_PROFILER_MAX_QUERIES   statements per request
+#     SQL_PROFILER_SLOW_MS       database time per request
+#     SQL_PROFILER_SLOW_QUERY_MS one statement
+#     SQL_PROFILER_REPEATS       runs of one fingerprint, the N+1 signal
+#
+# is logged as a warning, gets an X-SQL-Warning header and is kept in a ring
+# of the last SQL_PROFILER_KEEP such requests, which admins see slowest first
+# under SQL Profiler in the admin panel. Statements run outside a request
+# (upload workers, the order event poller) are not recorded. The numbers are
+# per process, like the pool metrics.
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\((?:\s*\?\s*,)*\s*\?\s*\)", re.IGNORECASE)
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|:\w+|\?")
+_SPACE = re.compile(r"\s+")
+
+
+def fingerprint(statement):
+    """The statement with its literals, placeholders and IN lists collapsed to ?."""
+    statement = _STRING.sub('?', statement)
+    statement = _PLACEHOLDER.sub('?', statement)
+    statement = _NUMBER.sub('?', statement)
+    statement = _IN_LIST.sub('IN (?)', statement)
+    return _SPACE.sub(' ', statement).strip()
+
+
+class RequestProfile:
+    """The statements of one request, by fingerprint."""
+
+    def __init__(self, method, path):
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.slowest_query = 0.0
+        self.statements = collections.defaultdict(lambda: [0, 0.0])  # fingerprint -> [count, seconds]
+
+    def record(self, statement, seconds):
+        self.queries += 1
+        self.db_time += seconds
+        self.slowest_query = max(self.slowest_query, seconds)
+        entry = self.statements[fingerprint(statement)]
+        entry[0] += 1
+        entry[1] += seconds
+
+    def repeated(self, repeats):
+        """(fingerprint, count, seconds) run at least repeats times, most runs first."""
+        return sorted(((statement, count, seconds) for statement, (count, seconds) in self.statements.items()
+                       if count >= repeats), key=lambda entry: -entry[1])
+
+    def problems(self, config):
+        problems = []
+        if self.queries > config.get('SQL_PROFILER_MAX_QUERIES', 20):
+            problems.append(f"{self.queries} queries")
+        if self.db_time * 1000 > config.get('SQL_PROFILER_SLOW_MS', 200):
+            problems.append(f"{self.db_time * 1000:.0f}ms in the database")
+        if self.slowest_query * 1000 > config.get('SQL_PROFILER_SLOW_QUERY_MS', 100):
+            problems.append(f"slow statement {self.slowest_query * 1000:.0f}ms")
+        repeated = self.repeated(config.get('SQL_PROFILER_REPEATS', 5))
+        if repeated:
+            problems.append(f"statement repeated {repeated[0][1]} times")
+        return problems
+
+
+class SQLProfiler:
+    def __init__(self, app=None):
+        self.app = None
+        self._lock = threading.Lock()
+        self._flagged = collections.deque(maxlen=100)
+        self.requests = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['sql_profiler'] = self
+        self._flagged = collections.deque(maxlen=app.config.get('SQL_PROFILER_KEEP', 100))
+        if not event.contains(Engine, 'before_cursor_execute', self._before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+        app.before_request(self._start)
+        app.after_request(self._finish)
+
+    @property
+    def enabled(self):
+        return bool(self.app and self.app.config.get('SQL_PROFILER'))
+
+    # ----- per request -----
+
+    def _start(self):
+        if self.enabled and not request.path.startswith('/static/'):
+            g.sql_profile = RequestProfile(request.method, request.path)
+
+    def _finish(self, response):
+        profile = g.pop('sql_profile', None)
+        if profile is None:
+            return response
+        elapsed = time.perf_counter() - profile.started
+        response.headers['Server-Timing'] = \
+            f'db;dur={profile.db_time * 1000:.1f};desc="{profile.queries} queries"'
+        problems = profile.problems(current_app.config)
+        with self._lock:
+            self.requests += 1
+            if problems:
+                self._flagged.append(self._summary(profile, problems, elapsed, response.status_code))
+        if problems:
+            response.headers['X-SQL-Warning'] = '; '.join(problems)
+            logger.warning("%s %s: %s", profile.method, profile.path, '; '.join(problems))
+        return response
+
+    def _summary(self, profile, problems, elapsed, status):
+        return {
+            'method': profile.method,
+            'path': profile.path,
+            'status': status,
+            'at': datetime.utcnow(),
+            'queries': profile.queries,
+            'db_ms': round(profile.db_time * 1000, 1),
+            'request_ms': round(elapsed * 1000, 1),
+            'slowest_query_ms': round(profile.slowest_query * 1000, 1),
+            'problems': problems,
+            'statements': [{'sql': statement, 'count': count, 'ms': round(seconds * 1000, 1)}
+                           for statement, (count, seconds)
+                           in sorted(profile.statements.items(), key=lambda item: -item[1][1])],
+        }
+
+    # ----- engine events -----
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None and has_request_context() and 'sql_profile' in g:
+            context.sql_profiler_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, 'sql_profiler_started', None)
+        profile = g.get('sql_profile') if started is not None and has_request_context() else None
+        if profile is not None:
+            profile.record(statement, time.perf_counter() - started)
+
+    # ----- reading -----
+
+    def slowest(self):
+        """The flagged requests kept, most database time first."""
+        with self._lock:
+            flagged = list(self._flagged)
+        return sorted(flagged, key=lambda summary: -summary['db_ms'])
+
+    def clear(self):
+        with self._lock:
+            self._flagged.clear()
+            self.requests = 0
+
+
+sql_profiler = SQLProfiler()
@@ -1,36 +1,82 @@
-let bucket = [];
+// The bucket lives on the server. The page only keeps its totals and the
+// version they belong to, and sends small operations (add/remove/set/clear)
+// to /bucket, one request at a time.
+let bucketVersion = 0;
+let bucketCount = 0;
+let bucketSubtotal = 0;
+let pendingBucketOps = Promise.resolve();
 
-function saveBucketAndGoToOrderDetails() {
-  if (!bucket || bucket.length === 0) {
-    alert(
-      "Please add at least one item to your bucket before proceeding to order details."
-    );
-    return;
-  }
-  fetch("/save_bucket", {
-    method: "POST",
-    headers: {
-      "Content-Type": "application/json",
-    },
-    body: JSON.stringify({ bucket }),
-  })
+function applyBucketTotals(data) {
+  bucketVersion = data.version;
+  bucketCount = data.count;
+  bucketSubtotal = data.subtotal;
+  updateBucketDisplay();
+}
+
+// Data the server rendered into the page as <script type="application/json">
+function readBootstrap(id) {
+  const el = document.getElementById(id);
+  return el ? JSON.parse(el.textContent) : null;
+}
+
+function loadBucketTotals() {
+  return fetch("/bucket")
     .then((res) => {
       if (!res.ok) {
         throw new Error("Network response was not ok");
       }
       return res.json();
     })
-    .then((data) => {
-      if (data.success) {
-        window.location.href = "/order_details";
-      } else {
-        throw new Error(data.error || "Failed to save bucket");
+    .then(applyBucketTotals);
+}
+
+function postBucketOps(ops, retry) {
+  return fetch("/bucket", {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+    },
+    body: JSON.stringify({
+      version: bucketVersion,
+      restaurant_id: parseInt(document.getElementById("restaurantId")?.value),
+      ops,
+    }),
+  }).then((res) =>
+    res.json().then((data) => {
+      if (res.status === 409 && retry) {
+        // Changed in another tab, redo the operations on top of that
+        applyBucketTotals(data);
+        return postBucketOps(ops, false);
+      }
+      if (!res.ok) {
+        if (data.version !== undefined) applyBucketTotals(data);
+        throw new Error(data.error || "Failed to update bucket");
       }
+      applyBucketTotals(data);
     })
+  );
+}
+
+function sendBucketOps(ops) {
+  pendingBucketOps = pendingBucketOps
+    .then(() => postBucketOps(ops, true))
     .catch((error) => {
       console.error("Error:", error);
-      alert("Failed to save bucket. Please try again.");
+      alert(error.message || "Failed to update bucket. Please try again.");
     });
+  return pendingBucketOps;
+}
+
+function saveBucketAndGoToOrderDetails() {
+  pendingBucketOps.then(() => {
+    if (bucketCount === 0) {
+      alert(
+        "Please add at least one item to your bucket before proceeding to order details."
+      );
+      return;
+    }
+    window.location.href = "/order_details";
+  });
 }
 
 function updateBucketDisplay() {
@@ -38,13 +84,8 @@ function updateBucketDisplay() {
   const summary = document.getElementById("bucket-summary");
   if (!iconCount || !summary) return;
 
-  const totalItems = bucket.reduce((sum, item) => sum + item.quantity, 0);
-  const totalPrice = bucket.reduce(
-    (sum, item) => sum + item.price * item.quantity,
-    0
-  );
-  iconCount.textContent = totalItems;
-  summary.textContent = `Subtotal: Rs. ${totalPrice}`;
+  iconCount.textContent = bucketCount;
+  summary.textContent = `Subtotal: Rs. ${bucketSubtotal}`;
 }
 
 function attachMenuButtons() {
@@ -53,21 +94,14 @@ function attachMenuButtons() {
       try {
         const id = parseInt(btn.dataset.id);
         const action = btn.dataset.action;
-        const name = btn.dataset.name;
-        const price = parseFloat(btn.dataset.price);
-        const restaurantId = parseInt(
-          document.getElementById("restaurantId").value
-        );
 
-        if (isNaN(id) || isNaN(price) || isNaN(restaurantId)) {
+        if (isNaN(id)) {
           throw new Error("Invalid item data");
         }
 
         let qtyEl = document.getElementById(`qty-${id}`);
         let quantity = parseInt(qtyEl?.textContent || "1");
 
-        let item = bucket.find((i) => i.id === id);
-
         if (action === "increase") {
           quantity = Math.min(99, quantity + 1);
           qtyEl.textContent = quantity;
@@ -75,19 +109,8 @@ function attachMenuButtons() {
           quantity = Math.max(1, quantity - 1);
           qtyEl.textContent = quantity;
         } else if (action === "add") {
-          if (item) {
-            item.quantity += quantity;
-          } else {
-            bucket.push({
-              id,
-              name,
-              price,
-              quantity,
-              restaurant_id: restaurantId,
-            });
-          }
+          sendBucketOps([{ op: "add", id, quantity }]);
           qtyEl.textContent = 1; // Reset
-          updateBucketDisplay();
         }
       } catch (error) {
         console.error("Error handling menu button:", error);
@@ -98,44 +121,45 @@ function attachMenuButtons() {
 }
 
 function clearBucket() {
-  bucket = [];
-  updateBucketDisplay();
+  return sendBucketOps([{ op: "clear" }]);
 }
 
-// Load bucket from server on page load
+// Bucket totals and the menu come inline with the page, they are only
+// fetched when a page does not have them
 document.addEventListener("DOMContentLoaded", () => {
-  // Load bucket from server
-  fetch("/get_bucket")
-    .then((res) => {
-      if (!res.ok) {
-        throw new Error("Network response was not ok");
-      }
-      return res.json();
-    })
-    .then((data) => {
-      if (data.bucket) {
-        bucket = data.bucket;
-        updateBucketDisplay();
-
+  const bucketData = readBootstrap("bucket-data");
+  if (bucketData) {
+    applyBucketTotals(bucketData);
+  }
+  if (
+    bucketData ||
+    document.getElementById("bucket-count-icon") ||
+    window.location.pathname === "/checkout"
+  ) {
+    pendingBucketOps = (bucketData ? Promise.resolve() : loadBucketTotals())
+      .then(() => {
         // Check if we're on checkout page and bucket is empty
-        if (window.location.pathname === "/checkout" && bucket.length === 0) {
+        if (window.location.pathname === "/checkout" && bucketCount === 0) {
           window.location.href = "/menu";
         }
-      }
-    })
-    .catch((error) => {
-      console.error("Error loading bucket:", error);
-    });
+      })
+      .catch((error) => {
+        console.error("Error loading bucket:", error);
+      });
+  }
 
   if (document.getElementById("menu-list")) {
     const restaurantId = document.getElementById("restaurantId").value;
-    fetch(`/api/menu?restaurant_id=${restaurantId}`)
-      .then((response) => {
-        if (!response.ok) {
-          throw new Error("Network response was not ok");
-        }
-        return response.json();
-      })
+    const menuData = readBootstrap("menu-data");
+    (menuData
+      ? Promise.resolve(menuData)
+      : fetch(`/api/menu?restaurant_id=${restaurantId}`).then((response) => {
+          if (!response.ok) {
+            throw new Error("Network response was not ok");
+          }
+          return response.json();
+        })
+    )
       .then((data) => {
         const menuContainer = document.getElementById("menu-list");
         const navbar = document.getElementById("category-navbar");
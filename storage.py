@@ -0,0 +1,148 @@
+import hashlib
+import shutil
+import tempfile
+import uuid
+from extensions import *
+from flask import Request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+
+SLIP_CHUNK_SIZE = 64 * 1024
+
+
+# =====================
+# Payment slip storage backends
+# =====================
+# Every backend exposes upload(local_path, filename, content_hash) -> remote file
+# id. They are built once per upload worker, so the Drive client is
+# authenticated once and then reused for every job that worker runs.
+
+class DriveStorage:
+    def __init__(self, credentials_file=SERVICE_ACCOUNT_FILE, folder_id=FOLDER_ID):
+        if not os.path.exists(credentials_file):
+            raise FileNotFoundError("Google Drive credentials not found")
+        creds = service_account.Credentials.from_service_account_file(credentials_file, scopes=SCOPES)
+        self.service = build('drive', 'v3', credentials=creds, cache_discovery=False)
+        self.folder_id = folder_id
+
+    def upload(self, local_path, filename, content_hash=None):
+        file_metadata = {
+            'name': filename,
+            'parents': [self.folder_id]
+        }
+        if content_hash:
+            file_metadata['appProperties'] = {'sha256': content_hash}
+        media = MediaFileUpload(local_path, resumable=True)
+        file = self.service.files().create(
+            body=file_metadata,
+            media_body=media,
+            fields='id'
+        ).execute()
+        return file.get('id')
+
+
+class LocalStorage:
+    """Stand-in for Drive that copies slips into a local directory."""
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+
+    def upload(self, local_path, filename, content_hash=None):
+        if content_hash:
+            # Content addressed, a slip that is already there is not copied again
+            file_id = content_hash
+            if os.path.exists(os.path.join(self.directory, file_id)):
+                return file_id
+        else:
+            file_id = f"{uuid.uuid4().hex}-{secure_filename(filename)}"
+        shutil.copyfile(local_path, os.path.join(self.directory, file_id))
+        return file_id
+
+
+def create_storage(config):
+    """Build the backend selected by UPLOAD_STORAGE ('drive' or 'local')."""
+    backend = config.get('UPLOAD_STORAGE', 'drive')
+    if backend == 'drive':
+        return DriveStorage()
+    if backend == 'local':
+        return LocalStorage(config['UPLOAD_LOCAL_DIR'])
+    raise ValueError(f"Unknown upload storage backend: {backend}")
+
+
+# =====================
+# Content addressed slip store
+# =====================
+# Uploads are hashed and size-checked chunk by chunk while werkzeug parses the
+# request (see SlipRequest), so an oversized slip is rejected as soon as it
+# crosses the limit and the SHA-256 is known before anything touches disk.
+# Slips are then kept once under their hash, which makes a re-upload of the
+# same file (e.g. a retried checkout) free.
+
+class HashingSpool:
+    """Writable upload buffer that hashes and counts every chunk written to it."""
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+        self._file = tempfile.SpooledTemporaryFile(max_size=limit or SLIP_CHUNK_SIZE * 8)
+
+    def write(self, chunk):
+        self.size += len(chunk)
+        if self.limit is not None and self.size > self.limit:
+            self._file.close()
+            raise RequestEntityTooLarge()
+        self.sha256.update(chunk)
+        return self._file.write(chunk)
+
+    @property
+    def digest(self):
+        return self.sha256.hexdigest()
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+
+class SlipRequest(Request):
+    """Request class that streams file uploads into a HashingSpool."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return HashingSpool(current_app.config.get('SLIP_MAX_BYTES'))
+
+
+def hash_upload(file, limit=None):
+    """Return (sha256, size) of an uploaded FileStorage, reading it in chunks if needed."""
+    stream = file.stream
+    if isinstance(stream, HashingSpool):
+        return stream.digest, stream.size
+    sha256, size = hashlib.sha256(), 0
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(SLIP_CHUNK_SIZE), b''):
+        size += len(chunk)
+        if limit is not None and size > limit:
+            raise RequestEntityTooLarge()
+        sha256.update(chunk)
+    stream.seek(0)
+    return sha256.hexdigest(), size
+
+
+class SlipStore:
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path_for(self, content_hash):
+        return os.path.join(self.directory, content_hash[:2], content_hash)
+
+    def put(self, file, content_hash):
+        """Store an uploaded file under its hash unless it is already there. Returns the path."""
+        path = self.path_for(content_hash)
+        if os.path.exists(path):
+            return path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial = f"{path}.{uuid.uuid4().hex}.part"
+        file.stream.seek(0)
+        with open(partial, 'wb') as out:
+            shutil.copyfileobj(file.stream, out, SLIP_CHUNK_SIZE)
+        os.replace(partial, path)  # Atomic, concurrent writers of the same slip are harmless
+        return path
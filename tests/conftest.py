@@ -0,0 +1,42 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """The app on a fresh SQLite database, with no background workers."""
+    monkeypatch.setenv('DATABASE_URL', 'sqlite:///' + str(tmp_path / 'test.db'))
+    monkeypatch.delenv('SQL_PROFILER', raising=False)
+    from setup import create_app
+    app = create_app()
+    # The per-process caches outlive an app, start every test with empty ones
+    from menu_cache import menu_cache
+    from pricing import price_index
+    from restaurant_directory import restaurant_directory
+    from session_store import server_sessions
+    from user_cache import user_cache
+    for cache in (menu_cache, price_index, restaurant_directory, user_cache):
+        cache.invalidate()
+    server_sessions.interface._backend = None
+    app.config.update(
+        TESTING=True,
+        WTF_CSRF_ENABLED=False,
+        UPLOAD_WORKERS=0,
+        SESSION_BACKEND='memory',
+        ORDER_EVENTS_BROKER='local',
+    )
+    yield app
+    from extensions import db
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+def login(client, user_id):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
@@ -0,0 +1,44 @@
+from datetime import datetime
+
+import pytest
+
+from conftest import login
+from extensions import db
+from models import Order, OrderStatus, Restaurant, Role, User
+
+
+@pytest.fixture
+def customer(app):
+    with app.app_context():
+        restaurant = Restaurant(name='KFC', code='K')
+        user = User(username='customer', email='customer@example.com', password='x', whatsapp_no='03000000000',
+                    role=Role.USER)
+        db.session.add_all([restaurant, user])
+        db.session.flush()
+        db.session.add(Order(id='K-000001', sequence=1, user_id=user.id, restaurant_id=restaurant.id, items='[]',
+                             status=OrderStatus.DELIVERED, special_instructions='Extra ketchup',
+                             created_at=datetime(2026, 10, 1)))
+        db.session.commit()
+        return user.id
+
+
+def test_malformed_history_cursor_is_rejected(app, customer):
+    client = app.test_client()
+    login(client, customer)
+    assert client.get('/account/orders?cursor=not-a-cursor').status_code == 400
+    assert client.get('/account/orders').status_code == 200
+
+
+def test_delivered_order_is_revalidated(app, customer):
+    client = app.test_client()
+    login(client, customer)
+    response = client.get('/order_details/K-000001')
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+    etag = response.headers['ETag']
+    assert client.get('/order_details/K-000001', headers={'If-None-Match': etag}).status_code == 304
+
+    with app.app_context():
+        db.session.get(Order, 'K-000001').special_instructions = 'No ketchup'
+        db.session.commit()
+    response = client.get('/order_details/K-000001', headers={'If-None-Match': etag})
+    assert response.status_code == 200 and response.json['special_instructions'] == 'No ketchup'
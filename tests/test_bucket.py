@@ -0,0 +1,58 @@
+import pytest
+
+from bucket import BucketConflict, apply_bucket_ops, load_bucket
+from conftest import login
+from extensions import db
+from models import Menu, Restaurant, Role, User
+from session_store import LocalRedis, RedisSessionBackend, SQLiteSessionBackend
+
+
+@pytest.fixture
+def shop(app):
+    with app.app_context():
+        restaurant = Restaurant(name='KFC', code='K')
+        user = User(username='customer', email='customer@example.com', password='x', whatsapp_no='03000000000',
+                    role=Role.USER)
+        db.session.add_all([restaurant, user])
+        db.session.flush()
+        db.session.add_all([Menu(restaurant_id=restaurant.id, name='Zinger', price=550, category='Burgers'),
+                            Menu(restaurant_id=restaurant.id, name='Fries', price=250, category='Sides')])
+        db.session.commit()
+        return restaurant.id, user.id
+
+
+@pytest.mark.parametrize('backend', ['sqlite', 'memory'])
+def test_bucket_writes_are_compare_and_set(tmp_path, backend):
+    store = SQLiteSessionBackend(str(tmp_path / 'sessions.db')) if backend == 'sqlite' \
+        else RedisSessionBackend(LocalRedis())
+    assert store.get_bucket('sid') is None
+    assert store.set_bucket('sid', 0, b'one', 60)
+    assert not store.set_bucket('sid', 0, b'two', 60)
+    assert store.set_bucket('sid', 1, b'two', 60)
+    assert not store.set_bucket('sid', 1, b'three', 60)
+    assert store.get_bucket('sid') == (2, b'two')
+    store.delete('sid')
+    assert store.get_bucket('sid') is None
+
+
+def test_two_tabs_sending_the_same_version(app, shop):
+    restaurant_id, user_id = shop
+    client = app.test_client()
+    login(client, user_id)
+    response = client.post('/bucket', json={'version': 0, 'restaurant_id': restaurant_id,
+                                            'ops': [{'op': 'add', 'id': 1}]})
+    assert response.status_code == 200 and response.json['version'] == 1
+
+    sid = client.get_cookie('session').value
+    with app.test_request_context('/bucket', method='POST', headers={'Cookie': f'session={sid}'}):
+        load_bucket()  # The first tab's request has read version 1...
+        response = client.post('/bucket', json={'version': 1, 'restaurant_id': restaurant_id,
+                                                'ops': [{'op': 'add', 'id': 2}]})
+        assert response.status_code == 200  # ...when the second tab's request writes version 2
+        with pytest.raises(BucketConflict):
+            apply_bucket_ops(1, restaurant_id, [{'op': 'add', 'id': 1}])
+
+    response = client.post('/bucket', json={'version': 1, 'restaurant_id': restaurant_id,
+                                            'ops': [{'op': 'add', 'id': 1}]})
+    assert response.status_code == 409 and response.json['version'] == 2
+    assert client.get('/get_bucket').json['bucket'][0]['quantity'] == 1
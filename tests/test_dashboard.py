@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from conftest import login
+from dashboard import load_dashboard_page
+from extensions import db
+from models import Menu, Order, OrderItem, OrderStatus, Payment, Restaurant, Rider, Role, User
+
+
+def add_orders(restaurant_id, user_id, rider_id, count, start=0):
+    for n in range(start + 1, start + count + 1):
+        order_id = 'K-%06d' % n
+        db.session.add(Order(id=order_id, sequence=n, user_id=user_id, restaurant_id=restaurant_id,
+                             rider_id=rider_id, items='[]', status=OrderStatus.PENDING,
+                             created_at=datetime(2026, 10, 1) + timedelta(minutes=n)))
+        db.session.add(Payment(order_id=order_id, user_id=user_id, amount=800))
+        db.session.add_all([
+            OrderItem(order_id=order_id, menu_id=1, restaurant_id=restaurant_id, name='Zinger', price=550, quantity=1),
+            OrderItem(order_id=order_id, menu_id=2, restaurant_id=restaurant_id, name='Fries', price=250, quantity=1),
+        ])
+    db.session.commit()
+
+
+def count_statements(app, client, url):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    assert response.status_code == 200
+    return len(statements)
+
+
+def test_dashboard_runs_the_same_statements_for_any_number_of_orders(app):
+    with app.app_context():
+        restaurant = Restaurant(name='KFC', code='K')
+        admin = User(username='admin', email='admin@example.com', password='x', whatsapp_no='03000000000',
+                     role=Role.ADMIN)
+        customers = [User(username=f'customer{n}', email=f'customer{n}@example.com', password='x',
+                          whatsapp_no='03000000000', role=Role.USER) for n in range(3)]
+        rider = Rider(name='Rider', contact='03000000000')
+        db.session.add_all([restaurant, admin, rider, *customers])
+        db.session.flush()
+        db.session.add_all([Menu(restaurant_id=restaurant.id, name='Zinger', price=550, category='Burgers'),
+                            Menu(restaurant_id=restaurant.id, name='Fries', price=250, category='Sides')])
+        db.session.commit()
+        restaurant_id, admin_id, rider_id = restaurant.id, admin.id, rider.id
+        customer_ids = [customer.id for customer in customers]
+
+    client = app.test_client()
+    login(client, admin_id)
+    url = f'/admin/orderdashboard?restaurant_id={restaurant_id}'
+    client.get(url)  # Warm the per-process caches (logged in user, restaurant list)
+
+    with app.app_context():
+        add_orders(restaurant_id, customer_ids[0], rider_id, 2)
+    with_two = count_statements(app, client, url)
+
+    with app.app_context():
+        for n, customer_id in enumerate(customer_ids):
+            add_orders(restaurant_id, customer_id, rider_id, 10, start=2 + n * 10)
+    with_many = count_statements(app, client, url)
+
+    assert with_many == with_two
+
+
+def test_current_orders_page_across_statuses(app):
+    statuses = [OrderStatus.PENDING, OrderStatus.VERIFIED, OrderStatus.DELIVERED, OrderStatus.PAYMENT_VERIFICATION]
+    with app.app_context():
+        restaurant = Restaurant(name='KFC', code='K')
+        customer = User(username='customer', email='customer@example.com', password='x', whatsapp_no='03000000000',
+                        role=Role.USER)
+        db.session.add_all([restaurant, customer])
+        db.session.flush()
+        for n in range(1, 10):
+            db.session.add(Order(id='K-%06d' % n, sequence=n, user_id=customer.id, restaurant_id=restaurant.id,
+                                 items='[]', status=statuses[n % 4], created_at=datetime(2026, 10, 1, n % 3)))
+        db.session.commit()
+
+        seen = []
+        cursor = None
+        while True:
+            orders, cursor = load_dashboard_page(restaurant.id, 'current', cursor, limit=2)
+            seen.extend(order.id for order in orders)
+            if cursor is None:
+                break
+        expected = sorted(((order.created_at, order.id) for order in Order.query
+                           if order.status != OrderStatus.DELIVERED), reverse=True)
+        assert seen == [order_id for _, order_id in expected]
@@ -0,0 +1,36 @@
+import pytest
+from sqlalchemy.pool import StaticPool
+
+from db_pool import MeteredQueuePool, database_config
+from extensions import db
+from setup import create_app
+
+
+def test_server_databases_get_the_metered_pool(tmp_path):
+    url, options = database_config(str(tmp_path), {'DATABASE_URL': 'mysql+pymysql://user:pass@db/nustbites',
+                                                   'DB_POOL_SIZE': '5'})
+    assert options['poolclass'] is MeteredQueuePool
+    assert options['pool_size'] == 5
+    assert 'ssl' not in options['connect_args']
+
+    (tmp_path / 'ca.pem').write_text('')
+    _, options = database_config(str(tmp_path), {'DATABASE_URL': url})
+    assert options['connect_args']['ssl'] == {'ca': str(tmp_path / 'ca.pem')}
+
+
+def test_missing_ssl_ca_is_an_error(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        database_config(str(tmp_path), {'DATABASE_URL': 'mysql+pymysql://user:pass@db/nustbites',
+                                        'DB_SSL_CA': str(tmp_path / 'missing.pem')})
+
+
+def test_in_memory_sqlite_keeps_one_database(monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', 'sqlite://')
+    app = create_app()
+    with app.app_context():
+        assert isinstance(db.engine.pool, StaticPool)
+        db.create_all()
+        with db.engine.connect() as first, db.engine.connect() as second:
+            assert first.exec_driver_sql("SELECT count(*) FROM user").scalar() == 0
+            assert second.exec_driver_sql("SELECT count(*) FROM user").scalar() == 0
+        db.engine.dispose()
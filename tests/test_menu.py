@@ -0,0 +1,31 @@
+from conftest import login
+from extensions import db
+from menu_cache import menu_cache
+from models import Menu, Restaurant, Role, User
+
+
+def test_menu_api_only_caches_known_restaurants(app):
+    app.config['MENU_CACHE_SIZE'] = 1
+    with app.app_context():
+        kfc, hardees = Restaurant(name='KFC', code='K'), Restaurant(name="Hardee's", code='H')
+        user = User(username='customer', email='customer@example.com', password='x', whatsapp_no='03000000000',
+                    role=Role.USER)
+        db.session.add_all([kfc, hardees, user])
+        db.session.flush()
+        db.session.add(Menu(restaurant_id=kfc.id, name='Zinger', price=550, category='Burgers'))
+        db.session.commit()
+        kfc_id, hardees_id, user_id = kfc.id, hardees.id, user.id
+
+    client = app.test_client()
+    login(client, user_id)
+    assert client.get('/api/menu?restaurant_id=999').status_code == 404
+    assert list(menu_cache._snapshots) == []
+
+    response = client.get(f'/api/menu?restaurant_id={kfc_id}')
+    assert response.status_code == 200
+    assert 'X-Menu-Version' not in response.headers
+    assert client.get(f'/api/menu?restaurant_id={kfc_id}',
+                      headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+    assert client.get(f'/api/menu?restaurant_id={hardees_id}').status_code == 200
+    assert list(menu_cache._snapshots) == [hardees_id]
@@ -0,0 +1,29 @@
+from datetime import datetime
+
+from extensions import db
+from models import (ArchivedOrder, Order, OrderStatus, Payment, Restaurant, Role, UploadJob, UploadJobStatus,
+                    User)
+from order_archive import archive_orders
+
+
+def test_orders_with_unfinished_slip_uploads_stay(app):
+    with app.app_context():
+        restaurant = Restaurant(name='KFC', code='K')
+        user = User(username='customer', email='customer@example.com', password='x', whatsapp_no='03000000000',
+                    role=Role.USER)
+        db.session.add_all([restaurant, user])
+        db.session.flush()
+        for n, job_status in enumerate([UploadJobStatus.DONE, UploadJobStatus.PENDING, UploadJobStatus.FAILED], 1):
+            order = Order(id=f'K-{n:06d}', sequence=n, user_id=user.id, restaurant_id=restaurant.id, items='[]',
+                          status=OrderStatus.DELIVERED, created_at=datetime(2025, 1, n))
+            payment = Payment(order_id=order.id, user_id=user.id, amount=100)
+            db.session.add_all([order, payment])
+            db.session.flush()
+            db.session.add(UploadJob(payment_id=payment.id, filename='slip.jpg', local_path='/tmp/slip',
+                                     status=job_status))
+        db.session.commit()
+
+        assert archive_orders(cutoff=datetime(2026, 1, 1)) == 1
+        assert [order.id for order in ArchivedOrder.query] == ['K-000001']
+        assert sorted(order.id for order in Order.query) == ['K-000002', 'K-000003']
+        assert sorted(job.status.name for job in UploadJob.query) == ['FAILED', 'PENDING']
@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+
+from extensions import db
+from models import OrderEvent
+from order_events import OrderEventHub
+
+
+def make_hub(app):
+    app.config['ORDER_EVENTS_BROKER'] = 'database'
+    hub = OrderEventHub()
+    hub.app = app
+    hub._poller = object()  # Polled by hand below
+    return hub
+
+
+def add_event(app, event_id, created_at=None):
+    with app.app_context():
+        db.session.add(OrderEvent(id=event_id, order_id=f'K-{event_id:06d}', restaurant_id=1, kind='updated',
+                                  status='VERIFIED', created_at=created_at or datetime.utcnow()))
+        db.session.commit()
+
+
+def test_event_committed_after_a_higher_id_is_not_skipped(app):
+    hub = make_hub(app)
+    add_event(app, 2)  # Id 1 is still in an open transaction
+    hub._poll_once()
+    position, watermark = hub.position()
+    assert watermark == 0
+
+    add_event(app, 1)
+    hub._poll_once()
+    position, watermark, events = hub.events_after(position, timeout=0)
+    assert [data['id'] for data in events] == [1]
+    assert watermark == 2
+
+    # A browser reconnecting with the watermark it was sent before id 1 arrived gets both
+    _, _, events = hub.catch_up(0)
+    assert [data['id'] for data in events] == [1, 2]
+
+
+def test_stream_sends_the_watermark_as_its_id(app):
+    hub = make_hub(app)
+    add_event(app, 2)
+    hub._poll_once()
+    stream = hub.stream(seconds=60)
+    assert next(stream) == 'retry: 3000\n\n'
+    add_event(app, 3)
+    add_event(app, 1)
+    hub._poll_once()
+    chunk = next(stream)
+    assert chunk.startswith('event: updated')  # First of the batch moves nothing
+    assert next(stream).startswith('id: 3\n')
+
+
+def test_gaps_are_given_up_after_a_while(app):
+    hub = make_hub(app)
+    app.config['ORDER_EVENTS_GAP_SECONDS'] = 0  # Id 1 was rolled back
+    add_event(app, 2)
+    hub._poll_once()
+    hub._poll_once()
+    assert hub.position()[1] == 2
+
+
+def test_old_events_are_pruned(app):
+    hub = make_hub(app)
+    add_event(app, 1, created_at=datetime.utcnow() - timedelta(days=2))
+    add_event(app, 2)
+    hub._prune()
+    with app.app_context():
+        assert [row.id for row in OrderEvent.query.order_by(OrderEvent.id)] == [2]
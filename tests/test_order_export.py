@@ -0,0 +1,26 @@
+import csv
+import io
+from datetime import datetime
+
+from extensions import db
+from models import Order, OrderStatus, Restaurant, Role, User
+from order_export import export_orders_csv
+
+
+def test_formula_like_text_is_escaped(app):
+    with app.app_context():
+        restaurant = Restaurant(name='KFC', code='K')
+        user = User(username='=HYPERLINK("http://example.com")', email='customer@example.com', password='x',
+                    whatsapp_no='+923000000000', role=Role.USER)
+        db.session.add_all([restaurant, user])
+        db.session.flush()
+        db.session.add(Order(id='K-000001', sequence=1, user_id=user.id, restaurant_id=restaurant.id, items='[]',
+                             status=OrderStatus.PENDING, special_instructions='@SUM(A1:A9)',
+                             created_at=datetime(2026, 10, 1)))
+        db.session.commit()
+
+        rows = list(csv.DictReader(io.StringIO(''.join(export_orders_csv()))))
+    assert rows[0]['username'] == '\'=HYPERLINK("http://example.com")'
+    assert rows[0]['whatsapp_no'] == "'+923000000000"
+    assert rows[0]['special_instructions'] == "'@SUM(A1:A9)"
+    assert rows[0]['restaurant'] == 'KFC'
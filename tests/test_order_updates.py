@@ -0,0 +1,67 @@
+from datetime import datetime
+
+from conftest import login
+from extensions import db
+from models import Order, OrderStatus, Restaurant, Role, User
+
+
+def setup_orders(app):
+    with app.app_context():
+        restaurant = Restaurant(name='KFC', code='K')
+        admin = User(username='admin', email='admin@example.com', password='x', whatsapp_no='03000000000',
+                     role=Role.ADMIN)
+        customer = User(username='customer', email='customer@example.com', password='x',
+                        whatsapp_no='03000000000', role=Role.USER)
+        db.session.add_all([restaurant, admin, customer])
+        db.session.flush()
+        db.session.add_all([Order(id='K-000001', sequence=1, user_id=customer.id, restaurant_id=restaurant.id,
+                                  items='[]', status=OrderStatus.DELIVERED, created_at=datetime(2026, 10, 1)),
+                            Order(id='K-000002', sequence=2, user_id=customer.id, restaurant_id=restaurant.id,
+                                  items='[]', status=OrderStatus.PENDING, created_at=datetime(2026, 10, 1))])
+        db.session.commit()
+        admin_id = admin.id
+    client = app.test_client()
+    login(client, admin_id)
+    return client
+
+
+def order_status(app, order_id):
+    with app.app_context():
+        return db.session.get(Order, order_id).status
+
+
+def test_single_update_follows_the_status_transitions(app):
+    client = setup_orders(app)
+
+    response = client.post('/admin/update_order/K-000001', data={'status': 'PENDING'})
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Cannot change DELIVERED to PENDING'
+    assert order_status(app, 'K-000001') == OrderStatus.DELIVERED
+
+    assert client.post('/admin/update_order/K-000002', data={'status': 'NOPE'}).status_code == 400
+    response = client.post('/admin/update_order/K-000002', data={'status': 'VERIFIED'})
+    assert response.get_json() == {'success': True}
+    assert order_status(app, 'K-000002') == OrderStatus.VERIFIED
+
+
+def test_bad_input_is_a_400(app):
+    client = setup_orders(app)
+
+    response = client.post('/admin/update_order/K-000002', data={'rider_id': 'abc'})
+    assert response.status_code == 400
+    assert response.get_json()['error'] == "Invalid rider_id 'abc'"
+
+    response = client.post('/admin/bulk_update_orders', json={'changes': [{'order_id': 'K-000002', 'rider_id': 'abc'}]})
+    assert response.status_code == 400
+    response = client.post('/admin/bulk_update_orders', json={'changes': [{'order_id': ['K-000002']}]})
+    assert response.status_code == 400
+    assert response.get_json()['error'] == "Invalid order_id ['K-000002']"
+
+    response = client.post('/admin/bulk_update_orders',
+                           json={'changes': [{'order_id': 'K-000001', 'status': 'PENDING'},
+                                             {'order_id': 'K-000002', 'status': 'VERIFIED'}]})
+    assert response.status_code == 200
+    assert response.get_json()['results'] == {
+        'K-000001': {'success': False, 'error': 'Cannot change DELIVERED to PENDING'},
+        'K-000002': {'success': True, 'status': 'VERIFIED'},
+    }
@@ -0,0 +1,32 @@
+import threading
+
+import pytest
+from flask import Flask
+
+from passwords import PasswordHasher, PasswordHasherBusy
+
+
+def test_requests_past_the_limit_are_turned_away():
+    app = Flask(__name__)
+    app.config.update(BCRYPT_LOG_ROUNDS=4, WEB_THREADS=4, PASSWORD_HASH_WORKERS=8)
+    hasher = PasswordHasher(app)
+    assert hasher.workers == 2  # Half of WEB_THREADS, more threads would only wait
+
+    release = threading.Event()
+    started = threading.Barrier(3)
+
+    def held(_):
+        started.wait()
+        release.wait(5)
+
+    waiting = [threading.Thread(target=hasher._run, args=(held, None)) for _ in range(2)]
+    for thread in waiting:
+        thread.start()
+    started.wait(5)
+    with pytest.raises(PasswordHasherBusy):
+        hasher.hash('secret')
+    release.set()
+    for thread in waiting:
+        thread.join()
+    assert hasher.rejected == 1
+    assert hasher.verify('secret', hasher.hash('secret'))[0]
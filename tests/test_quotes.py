@@ -0,0 +1,51 @@
+import pytest
+
+from conftest import login
+from extensions import db
+from models import ExtraCharges, Menu, PromoCode, PromoCodeType, Restaurant, Role, User
+
+
+@pytest.fixture
+def shop(app):
+    with app.app_context():
+        restaurant = Restaurant(name='KFC', code='K')
+        user = User(username='customer', email='customer@example.com', password='x', whatsapp_no='03000000000',
+                    role=Role.USER)
+        db.session.add_all([restaurant, user, ExtraCharges(charge_name='Standard Fee', value=150)])
+        db.session.flush()
+        db.session.add_all([Menu(restaurant_id=restaurant.id, name='Zinger', price=550, category='Burgers'),
+                            PromoCode(restaurant_id=restaurant.id, code='HALF', discount_percentage=50,
+                                      type=PromoCodeType.MENU)])
+        db.session.commit()
+        return restaurant.id, user.id
+
+
+@pytest.mark.parametrize('entry', [
+    {'bucket': [1, 2]},
+    {'bucket': [{'id': 1}, 'x']},
+    {'bucket': [], 'promo_code': 5},
+    {'bucket': [], 'delivery_type': ['standard']},
+])
+def test_badly_shaped_quote_requests_are_rejected(app, shop, entry):
+    client = app.test_client()
+    login(client, shop[1])
+    assert client.post('/api/quotes', json={'buckets': [entry]}).status_code == 400
+
+
+def test_promo_code_applied_at_checkout(app, shop):
+    restaurant_id, user_id = shop
+    client = app.test_client()
+    login(client, user_id)
+    client.post('/bucket', json={'version': 0, 'restaurant_id': restaurant_id, 'ops': [{'op': 'add', 'id': 1}]})
+    client.get('/order_details')
+    form = {'delivery_type': 'standard', 'location_id': '', 'special_instructions': ''}
+    page = client.post('/checkout', data=form).get_data(as_text=True)
+    assert 'Rs.700.00' in page
+
+    # The APPLY form posts back to the checkout page with the code
+    page = client.post('/checkout', data=dict(form, promo_code='HALF')).get_data(as_text=True)
+    assert 'Promo code HALF applied.' in page and 'Rs.425.00' in page
+    assert 'value="HALF"' in page
+
+    page = client.post('/checkout', data=dict(form, promo_code='NOPE')).get_data(as_text=True)
+    assert 'Invalid promo code' in page
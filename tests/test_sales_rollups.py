@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from extensions import db
+from models import MenuItemSalesDaily, Order, OrderItem, OrderStatus, Payment, Restaurant, RestaurantSalesHourly, \
+    Role, User
+from sales_rollups import rebuild, record_order
+
+
+def place_order(number, user_id, created_at):
+    order = Order(id='K-%06d' % number, sequence=number, user_id=user_id, restaurant_id=1, items='[]',
+                  status=OrderStatus.PENDING, created_at=created_at)
+    order.order_items = [OrderItem(menu_id=7, restaurant_id=1, name='Zinger', price=550, quantity=2)]
+    db.session.add_all([order, Payment(order_id=order.id, user_id=user_id, amount=1100)])
+    db.session.flush()
+    record_order(order, 1100)
+    db.session.commit()
+
+
+@pytest.fixture
+def customer(app):
+    with app.app_context():
+        user = User(username='customer', email='customer@example.com', password='x', whatsapp_no='03000000000',
+                    role=Role.USER)
+        db.session.add_all([Restaurant(id=1, name='KFC', code='K'), user])
+        db.session.commit()
+        return user.id
+
+
+def test_orders_of_one_item_add_up_on_one_row(app, customer):
+    yesterday = datetime.utcnow().replace(hour=12, minute=0) - timedelta(days=1)
+    with app.app_context():
+        for number in range(1, 4):
+            place_order(number, customer, yesterday)
+        row = db.session.get(MenuItemSalesDaily, (7, yesterday.date()))
+        assert (row.restaurant_id, row.quantity, row.revenue) == (1, 6, 3300)
+
+        rebuild(yesterday.date())
+        db.session.expire_all()
+        row = db.session.get(MenuItemSalesDaily, (7, yesterday.date()))
+        assert (row.restaurant_id, row.quantity, row.revenue) == (1, 6, 3300)
+        hourly = db.session.get(RestaurantSalesHourly, (1, yesterday.replace(second=0, microsecond=0)))
+        assert (hourly.orders, hourly.items) == (3, 6)
+
+
+def test_rebuild_stops_before_today(app, customer):
+    with app.app_context():
+        with pytest.raises(ValueError):
+            rebuild(until=datetime.utcnow().date())
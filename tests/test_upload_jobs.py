@@ -0,0 +1,67 @@
+import hashlib
+import os
+
+import pytest
+
+from extensions import db
+from models import Order, Payment, Restaurant, Role, SlipBlob, UploadJob, UploadJobStatus, User
+from storage import LocalStorage
+from upload_jobs import UploadWorkerPool
+
+
+@pytest.fixture
+def shared_slip(app, tmp_path):
+    """Two pending jobs for the same slip content, sharing one spool file."""
+    data = b'same slip'
+    content_hash = hashlib.sha256(data).hexdigest()
+    spool = tmp_path / 'spool'
+    spool.mkdir()
+    path = spool / content_hash
+    path.write_bytes(data)
+    with app.app_context():
+        restaurant = Restaurant(name='KFC', code='K')
+        user = User(username='customer', email='customer@example.com', password='x', whatsapp_no='03000000000',
+                    role=Role.USER)
+        db.session.add_all([restaurant, user])
+        db.session.flush()
+        for n in (1, 2):
+            order = Order(id=f'K-{n:06d}', sequence=n, user_id=user.id, restaurant_id=restaurant.id, items='[]')
+            payment = Payment(order_id=order.id, user_id=user.id, amount=100)
+            db.session.add_all([order, payment])
+            db.session.flush()
+            db.session.add(UploadJob(payment_id=payment.id, filename='slip.jpg', local_path=str(path),
+                                     content_hash=content_hash))
+        db.session.commit()
+    return path
+
+
+def test_shared_spool_file_is_kept_until_the_last_job_is_done(app, tmp_path, shared_slip):
+    workers = UploadWorkerPool()
+    workers.app = app
+    storage = LocalStorage(str(tmp_path / 'uploads'))
+    with app.app_context():
+        assert workers.run_once(storage)
+        assert os.path.exists(shared_slip)  # The other job still points to it
+        assert workers.run_once(storage)
+        assert not os.path.exists(shared_slip)
+        assert {job.status for job in UploadJob.query} == {UploadJobStatus.DONE}
+        assert {job.last_error for job in UploadJob.query} == {None}
+        assert SlipBlob.query.count() == 1
+        assert {payment.drive_file_id for payment in Payment.query} == {SlipBlob.query.one().remote_id}
+
+
+class BrokenStorage:
+    def upload(self, path, filename, content_hash):
+        raise OSError('storage is down')
+
+
+def test_spool_file_of_failed_jobs_is_removed(app, shared_slip):
+    app.config['UPLOAD_MAX_ATTEMPTS'] = 1
+    workers = UploadWorkerPool()
+    workers.app = app
+    with app.app_context():
+        assert workers.run_once(BrokenStorage())
+        assert os.path.exists(shared_slip)  # The other job may still upload it
+        assert workers.run_once(BrokenStorage())
+        assert not os.path.exists(shared_slip)
+        assert {(job.status, job.last_error) for job in UploadJob.query} == {(UploadJobStatus.FAILED, 'storage is down')}
@@ -0,0 +1,26 @@
+from conftest import login
+from extensions import db
+from models import Role, User
+from viewmodels import UserModelView
+
+
+def test_deleted_user_is_logged_out_at_once(app):
+    with app.app_context():
+        admin = User(username='admin', email='admin@example.com', password='x', whatsapp_no='03000000000',
+                     role=Role.ADMIN)
+        customer = User(username='customer', email='customer@example.com', password='x',
+                        whatsapp_no='03000000000', role=Role.USER)
+        db.session.add_all([admin, customer])
+        db.session.commit()
+        customer_id = customer.id
+
+    customer_client = app.test_client()
+    login(customer_client, customer_id)
+    assert customer_client.get('/account/orders').status_code == 200  # Now in the user cache
+
+    with app.test_request_context():
+        view = next(view for view in app.extensions['admin'][0]._views if isinstance(view, UserModelView))
+        assert view.delete_model(db.session.get(User, customer_id))
+        assert db.session.get(User, customer_id) is None
+
+    assert customer_client.get('/account/orders').status_code == 401
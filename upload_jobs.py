@@ -0,0 +1,206 @@
+import argparse
+import logging
+import threading
+import uuid
+from datetime import timedelta
+from extensions import *
+from models import Payment, SlipBlob, UploadJob, UploadJobStatus
+from sqlalchemy.exc import IntegrityError
+from storage import SlipStore, create_storage, hash_upload
+
+
+logger = logging.getLogger(__name__)
+
+
+# =====================
+# Payment slip upload queue
+# =====================
+# create_order only stores the slip on disk (once per content hash, see
+# storage.SlipStore) and inserts an UploadJob in the same transaction as the
+# order. A pool of worker threads picks the jobs up, uploads
+# them with one storage client per worker, records the remote id on the Payment
+# and retries failures with exponential backoff. Jobs live in the database, so
+# they survive restarts and can be shared by several processes. A job's spool
+# file is removed once it is DONE, or FAILED after UPLOAD_MAX_ATTEMPTS tries,
+# unless another pending job shares it.
+
+def queue_payment_slip(payment, file, config):
+    """Attach an uploaded slip to a payment (committed by the caller).
+
+    A slip that was uploaded before is linked straight to its stored copy, with
+    no disk write and no upload. Anything else is written to the content
+    addressed spool and an UploadJob is added. Returns the job, or None.
+    """
+    content_hash, _ = hash_upload(file, config.get('SLIP_MAX_BYTES'))
+    blob = db.session.get(SlipBlob, content_hash)
+    if blob:
+        payment.drive_file_id = blob.remote_id
+        return None
+    local_path = SlipStore(config['UPLOAD_SPOOL_DIR']).put(file, content_hash)
+    job = UploadJob(payment=payment, filename=secure_filename(file.filename),
+                    local_path=local_path, content_hash=content_hash)
+    db.session.add(job)
+    return job
+
+
+class UploadWorkerPool:
+    def __init__(self, app=None):
+        self.app = None
+        self._threads = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['upload_workers'] = self
+
+        @app.before_request
+        def start_upload_workers():
+            if not self._threads:
+                self.start()
+
+    def start(self, workers=None):
+        """Start the worker threads, UPLOAD_WORKERS of them unless workers is given."""
+        with self._lock:
+            if self._threads:
+                return
+            self._stopping.clear()
+            if workers is None:
+                workers = self.app.config.get('UPLOAD_WORKERS', 2)
+            for index in range(int(workers)):
+                thread = threading.Thread(target=self._run, name=f'upload-worker-{index}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def notify(self):
+        """Wake the workers after a new job was committed."""
+        self._wakeup.set()
+
+    def _run(self):
+        storage = None
+        poll_interval = self.app.config.get('UPLOAD_POLL_INTERVAL', 5)
+        while not self._stopping.is_set():
+            with self.app.app_context():
+                try:
+                    if storage is None:
+                        storage = create_storage(self.app.config)
+                    worked = self.run_once(storage)
+                except Exception:
+                    logger.exception("Upload worker failed")
+                    db.session.rollback()
+                    worked = False
+                finally:
+                    db.session.remove()
+            if not worked:
+                self._wakeup.wait(poll_interval)
+                self._wakeup.clear()
+
+    def run_once(self, storage):
+        """Claim and run a single due job. Returns False when there was nothing to do."""
+        job = self._claim()
+        if job is None:
+            return False
+        blob = db.session.get(SlipBlob, job.content_hash) if job.content_hash else None
+        remote_id = blob.remote_id if blob else None
+        # No transaction (and no pooled connection) is held during the upload
+        db.session.close()
+        if remote_id is None:
+            try:
+                remote_id = storage.upload(job.local_path, job.filename, job.content_hash)
+            except Exception as e:
+                self._failed(job, e)
+                return True
+            if job.content_hash:
+                db.session.add(SlipBlob(sha256=job.content_hash, size=os.path.getsize(job.local_path),
+                                        remote_id=remote_id))
+        try:
+            self._finished(job, remote_id)
+        except IntegrityError:
+            # Another worker recorded the same slip first, its copy is just as good
+            db.session.rollback()
+            self._finished(job, remote_id)
+        self._remove_spool_file(job)
+        return True
+
+    def _remove_spool_file(self, job):
+        # Jobs for the same content share one spool file, it goes once none of them
+        # still needs it (jobs queued from now on find the SlipBlob instead)
+        still_needed = db.session.query(UploadJob.id).filter(
+            UploadJob.local_path == job.local_path, UploadJob.id != job.id,
+            UploadJob.status.in_([UploadJobStatus.PENDING, UploadJobStatus.RUNNING])).first()
+        db.session.rollback()
+        if still_needed is None and os.path.exists(job.local_path):
+            try:
+                os.remove(job.local_path)
+            except FileNotFoundError:
+                pass  # Another worker removed it meanwhile
+
+    def _finished(self, job, remote_id):
+        Payment.query.filter_by(id=job.payment_id).update({'drive_file_id': remote_id})
+        UploadJob.query.filter_by(id=job.id).update({'status': UploadJobStatus.DONE, 'last_error': None})
+        db.session.commit()
+
+    def _claim(self):
+        # A job is due when it is pending and its run_at has passed, or when it
+        # is running but its lease expired (the worker that had it died).
+        now = datetime.utcnow()
+        lease = timedelta(seconds=self.app.config.get('UPLOAD_LEASE_SECONDS', 300))
+        due = db.and_(UploadJob.status.in_([UploadJobStatus.PENDING, UploadJobStatus.RUNNING]),
+                      UploadJob.run_at <= now)
+        job = db.session.query(UploadJob.id, UploadJob.payment_id, UploadJob.filename,
+                               UploadJob.local_path, UploadJob.content_hash, UploadJob.attempts) \
+            .filter(due).order_by(UploadJob.run_at).first()
+        if job is None:
+            db.session.rollback()
+            return None
+        # Conditional UPDATE so only one worker (in any process) wins the job
+        claimed = UploadJob.query.filter(UploadJob.id == job.id, due).update(
+            {'status': UploadJobStatus.RUNNING, 'run_at': now + lease, 'attempts': UploadJob.attempts + 1},
+            synchronize_session=False)
+        db.session.commit()
+        return job if claimed else None
+
+    def _failed(self, job, error):
+        max_attempts = self.app.config.get('UPLOAD_MAX_ATTEMPTS', 8)
+        base = self.app.config.get('UPLOAD_BACKOFF_SECONDS', 5)
+        attempts = job.attempts + 1
+        if attempts >= max_attempts:
+            logger.error("Giving up on upload job %s: %s", job.id, error)
+            changes = {'status': UploadJobStatus.FAILED}
+        else:
+            delay = min(base * 2 ** (attempts - 1), 3600)
+            changes = {'status': UploadJobStatus.PENDING, 'run_at': datetime.utcnow() + timedelta(seconds=delay)}
+        changes['last_error'] = str(error)
+        UploadJob.query.filter_by(id=job.id).update(changes)
+        db.session.commit()
+        if changes['status'] == UploadJobStatus.FAILED:
+            self._remove_spool_file(job)
+
+
+upload_workers = UploadWorkerPool()
+
+
+if __name__ == '__main__':
+    # Dedicated worker process, with UPLOAD_WORKERS = 0 in the web processes:
+    #     python upload_jobs.py --workers 4
+    import upload_jobs
+    from setup import create_app
+    parser = argparse.ArgumentParser(description='Run payment slip upload workers')
+    parser.add_argument('--workers', type=int, default=2, help='worker threads (default: 2)')
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error('--workers must be at least 1')
+    create_app()
+    upload_jobs.upload_workers.start(args.workers)
+    for thread in upload_jobs.upload_workers._threads:
+        thread.join()
@@ -0,0 +1,68 @@
+import collections
+import threading
+import time
+from sqlalchemy.orm import make_transient_to_detached
+from extensions import *
+from models import User
+
+
+# =====================
+# Logged in users
+# =====================
+# Flask-Login loads current_user on every authenticated request. The column
+# values of recently seen users are kept in a per-process LRU of at most
+# USER_CACHE_SIZE users, each trusted for USER_CACHE_TTL seconds, and every
+# request gets its own detached User built from them, so no query is run and
+# no instance is shared between requests. Treat current_user as read-only:
+# to change a user, load it with db.session.get(User, id).
+# UserModelView drops a user as soon as it is edited or deleted in this
+# process; changes made by another process (a changed role, say) show up
+# after the TTL.
+
+class UserCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._users = collections.OrderedDict()  # user_id -> (column values, loaded_at)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        """A detached copy of the user, or None if there is no such user."""
+        ttl = current_app.config.get('USER_CACHE_TTL', 60)
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is not None and time.monotonic() - entry[1] <= ttl:
+                self._users.move_to_end(user_id)
+                self.hits += 1
+                return self._build(entry[0])
+            self.misses += 1
+
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        values = {column.key: getattr(user, column.key) for column in User.__mapper__.column_attrs}
+        with self._lock:
+            self._users[user_id] = (values, time.monotonic())
+            self._users.move_to_end(user_id)
+            while len(self._users) > current_app.config.get('USER_CACHE_SIZE', 10000):
+                self._users.popitem(last=False)
+        return self._build(values)
+
+    def _build(self, values):
+        user = User(**values)
+        make_transient_to_detached(user)
+        return user
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._users.clear()
+            else:
+                self._users.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._users)}
+
+
+user_cache = UserCache()
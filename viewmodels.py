@@ -1,5 +1,12 @@
 from extensions import *
 from models import *
+from pricing import price_index
+from menu_cache import menu_cache
+from user_cache import user_cache
+from restaurant_directory import restaurant_directory
+from passwords import password_hasher
+from sql_profiler import sql_profiler
+from flask_admin import BaseView, expose
 
 
 
@@ -32,12 +39,21 @@ class UserModelView(ModelView):
     }
  }
 
-    # ✅ Automatically hash password before saving
+    # ✅ Automatically hash password before saving (bcrypt, like register)
     def on_model_change(self, form, model, is_created):
         if form.password.data:
-            model.password = generate_password_hash(form.password.data)
+            model.password = password_hasher.hash(form.password.data)
         super().on_model_change(form, model, is_created)
 
+    # Logged in users are cached, drop the cached copy once the edit or delete is committed
+    def after_model_change(self, form, model, is_created):
+        user_cache.invalidate(model.id)
+        super().after_model_change(form, model, is_created)
+
+    def after_model_delete(self, model):
+        user_cache.invalidate(model.id)
+        super().after_model_delete(model)
+
     # ✅ Only admins can access this model view
     def is_accessible(self):
         return current_user.is_authenticated and getattr(current_user, 'role', None) == Role.ADMIN
@@ -61,6 +77,18 @@ class RestaurantModelView(ModelView):
     # Optional: Add search capability
     column_searchable_list = ['name', 'code']
 
+    # Order number blocks cache the restaurant code, drop them when it changes.
+    # Every page lists the restaurants from the directory snapshot, rebuild it too.
+    def after_model_change(self, form, model, is_created):
+        from order_numbers import allocator
+        allocator.reset(model.id)
+        restaurant_directory.invalidate()
+        super().after_model_change(form, model, is_created)
+
+    def after_model_delete(self, model):
+        restaurant_directory.invalidate()
+        super().after_model_delete(model)
+
     # Optional: Access control
     def is_accessible(self):
         return current_user.is_authenticated and getattr(current_user, 'role', None) == Role.ADMIN
@@ -87,6 +115,18 @@ class MenuModelView(ModelView):
     can_edit = True
     can_delete = True
 
+    # Menus are cached for /api/menu and the quote engine, rebuild after every write
+    def after_model_change(self, form, model, is_created):
+        # An edited item may have moved to another restaurant, so drop every menu
+        menu_cache.invalidate(model.restaurant_id if is_created else None)
+        price_index.invalidate()
+        super().after_model_change(form, model, is_created)
+
+    def after_model_delete(self, model):
+        menu_cache.invalidate(model.restaurant_id)
+        price_index.invalidate()
+        super().after_model_delete(model)
+
     def is_accessible(self):
         return current_user.is_authenticated and current_user.role.name == 'ADMIN'  # Or use Role.ADMIN if enum
 
@@ -141,6 +181,15 @@ class ExtraChargesModelView(ModelView):
         'value': 'Amount (Rs.)'
     }
 
+    # Delivery fees are cached for the quote engine, rebuild after every write
+    def after_model_change(self, form, model, is_created):
+        price_index.invalidate()
+        super().after_model_change(form, model, is_created)
+
+    def after_model_delete(self, model):
+        price_index.invalidate()
+        super().after_model_delete(model)
+
     def is_accessible(self):
         return current_user.is_authenticated and getattr(current_user, 'role', None) == Role.ADMIN
 
@@ -194,4 +243,56 @@ class PromoCodeModelView(ModelView):
         return redirect(url_for('routes.login'))
 
 
+class SalesRollupModelView(ModelView):
+    # Filled in by sales_rollups.py, read only here
+    can_create = False
+    can_edit = False
+    can_delete = False
+    can_export = True
+    page_size = 100
+
+    def is_accessible(self):
+        return current_user.is_authenticated and getattr(current_user, 'role', None) == Role.ADMIN
+
+    def inaccessible_callback(self, name, **kwargs):
+        flash("You are not authorized to access this page.", "danger")
+        return redirect(url_for('routes.login'))
+
+class RestaurantSalesHourlyModelView(SalesRollupModelView):
+    column_list = ('restaurant_id', 'hour', 'orders', 'items', 'revenue', 'delivered_orders')
+    column_filters = ['restaurant_id', 'hour']
+    column_default_sort = ('hour', True)
+    column_labels = {
+        'restaurant_id': 'Restaurant',
+        'revenue': 'Revenue (Rs.)',
+    }
+
+class MenuItemSalesDailyModelView(SalesRollupModelView):
+    column_list = ('day', 'restaurant_id', 'menu_id', 'quantity', 'revenue')
+    column_filters = ['restaurant_id', 'menu_id', 'day']
+    column_default_sort = ('day', True)
+    column_labels = {
+        'restaurant_id': 'Restaurant',
+        'menu_id': 'Menu Item',
+        'revenue': 'Revenue (Rs.)',
+    }
+
 
+class SQLProfilerView(BaseView):
+    # Requests flagged by sql_profiler.py in this process, most database time first
+    @expose('/')
+    def index(self):
+        return self.render('admin/sql_profiler.html', enabled=sql_profiler.enabled,
+                           requests=sql_profiler.requests, flagged=sql_profiler.slowest())
+
+    @expose('/clear', methods=['POST'])
+    def clear(self):
+        sql_profiler.clear()
+        return redirect(url_for('.index'))
+
+    def is_accessible(self):
+        return current_user.is_authenticated and getattr(current_user, 'role', None) == Role.ADMIN
+
+    def inaccessible_callback(self, name, **kwargs):
+        flash("You are not authorized to access this page.", "danger")
+        return redirect(url_for('routes.login'))